@@ -0,0 +1,133 @@
+"""Time build_site on a synthetic site, end to end and by phase
+
+Run from the repository root, for example::
+
+    python -m benchmarks.build --markdown-pages 2000 --jobs 4 --output results.json
+    python -m benchmarks.build --markdown-pages 2000 --compare results.json
+
+Each scenario builds the same generated site: "cold" starts without an output
+directory or build cache, "warm" rebuilds with both left in place. With --compare,
+the exit status is non-zero if any scenario got slower than the threshold allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.generate import add_arguments, generate_site, get_site_options
+from skip_ssg import skip
+from skip_ssg.profiler import profiler
+
+
+def build(config: Dict) -> Dict:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        skip.build_site(config, skip.false)
+    elapsed = time.perf_counter() - start
+
+    phases = {
+        phase: total
+        for phase, (total, _) in profiler.get_phase_totals().items()
+        if phase != "build"
+    }
+    return {"total": elapsed, "phases": phases}
+
+
+def run_scenario(config: Dict, repeat: int, cold: bool) -> Dict:
+    runs = []
+    for _ in range(repeat):
+        if cold:
+            shutil.rmtree(config["output"], ignore_errors=True)
+            shutil.rmtree(config["cache_dir"], ignore_errors=True)
+        runs.append(build(config))
+
+    best = min(runs, key=lambda run: run["total"])
+    return {
+        "best": best["total"],
+        "median": statistics.median(run["total"] for run in runs),
+        "phases": best["phases"],
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    passed = True
+    for name, result in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        before = baseline["scenarios"][name]["best"]
+        ratio = result["best"] / before if before else 1
+        status = "ok"
+        if ratio > threshold:
+            status = "REGRESSION"
+            passed = False
+        print(f"{name}: {before:.3f}s -> {result['best']:.3f}s ({ratio:.2f}x) {status}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--repeat", help="Builds per scenario", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="A results file to compare against")
+    parser.add_argument(
+        "--threshold",
+        help="The slowdown relative to --compare that counts as a regression",
+        type=float,
+        default=1.2,
+    )
+    args = parser.parse_args()
+
+    site_options = get_site_options(args)
+    config = {
+        "output": "_site",
+        "copy": [],
+        "fail_on_error": True,
+        "jobs": args.jobs,
+        "cache_dir": ".skip-cache",
+        "profile": True,
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as td:
+        generate_site(Path(td), **site_options)
+        os.chdir(td)
+        try:
+            scenarios = {
+                "cold": run_scenario({**config, "cache": False}, args.repeat, True),
+                "cold_cached": run_scenario(config, args.repeat, True),
+                "warm": run_scenario(config, args.repeat, False),
+            }
+        finally:
+            os.chdir(cwd)
+
+    results = {"site": site_options, "jobs": args.jobs, "scenarios": scenarios}
+    for name, result in scenarios.items():
+        phases = ", ".join(
+            f"{phase} {total:.3f}s" for phase, total in result["phases"].items()
+        )
+        print(f"{name}: best {result['best']:.3f}s, median {result['median']:.3f}s")
+        print(f"  {phases}")
+
+    if args.output:
+        with open(args.output, "w+") as outfile:
+            json.dump(results, outfile, indent=2)
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
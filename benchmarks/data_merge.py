@@ -0,0 +1,56 @@
+"""Time get_page_files on a directory with many data files
+
+Run from the repository root with ``python -m benchmarks.data_merge``. Every data
+file should be loaded exactly once, so load calls should equal the file count.
+"""
+import argparse
+import json
+from pathlib import Path
+import tempfile
+import time
+
+from skip_ssg import skip
+from skip_ssg.sources import JSONFile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--data-files", type=int, default=1000)
+    parser.add_argument("-p", "--pages", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        root = Path(td)
+        for i in range(args.data_files):
+            with open(root / f"data_{i}.json", "w+") as outfile:
+                json.dump({f"key_{i}": i}, outfile)
+        for i in range(args.pages):
+            with open(root / f"page_{i}.md", "w+") as outfile:
+                outfile.write(f"# Page {i}")
+        subdir = root / "sub"
+        subdir.mkdir()
+        with open(subdir / "page.md", "w+") as outfile:
+            outfile.write("# Sub page")
+
+        loads = 0
+        get_data = JSONFile.get_data
+
+        def counting_get_data(self):
+            nonlocal loads
+            loads += 1
+            return get_data(self)
+
+        JSONFile.get_data = counting_get_data
+        try:
+            start = time.perf_counter()
+            page_files = skip.get_page_files(set(), skip.false, root, {}, True)
+            elapsed = time.perf_counter() - start
+        finally:
+            JSONFile.get_data = get_data
+
+    print(f"{args.data_files} data files, {len(page_files)} pages")
+    print(f"get_page_files: {elapsed * 1000:.1f}ms, {loads} data file loads")
+
+
+if __name__ == "__main__":
+    main()
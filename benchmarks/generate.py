@@ -0,0 +1,249 @@
+"""Generate synthetic sites for benchmarking
+
+Run from the repository root with ``python -m benchmarks.generate DIR`` to write a
+site to DIR, or use generate_site from other benchmarks.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import random
+from typing import List
+
+BASE_LAYOUT = """<!DOCTYPE html>
+<html>
+  <head>
+    <title>{{ data.title }} | {{ data.site.name }}</title>
+  </head>
+  <body>
+    {% include "nav.html" %}
+    <main>
+      {{ content }}
+    </main>
+  </body>
+</html>
+"""
+
+NAV = """<nav>
+  {% for link in data.site.links %}
+    <a href="{{ link.url }}">{{ link.title }}</a>
+  {% endfor %}
+</nav>
+"""
+
+INDEX_PAGE = """---
+layout: base.html
+title: Home
+permalink: /
+---
+<ul>
+  {% for post in collections.posts[-20:] %}
+    <li><a href="{{ post.get_permalink() }}">{{ post.data.title }}</a></li>
+  {% endfor %}
+</ul>
+"""
+
+TAG_PAGE = """---
+layout: base.html
+title: {tag}
+pagination:
+  data: {tag}
+  size: {size}
+permalink: "/tags/{tag}/{{% if index %}}{{{{ index }}}}/{{% endif %}}"
+---
+<h1>{tag}, page {{{{ index }}}}</h1>
+<ul>
+  {{% for post in items %}}
+    <li><a href="{{{{ post.get_permalink() }}}}">{{{{ post.data.title }}}}</a></li>
+  {{% endfor %}}
+</ul>
+"""
+
+DATA_PAGE = """---
+layout: base.html
+title: Records
+pagination:
+  data: {dataset}
+  size: {size}
+permalink: "/records/{{% if index %}}{{{{ index }}}}/{{% endif %}}"
+---
+<table>
+  {{% for record in items %}}
+    <tr><td>{{{{ record.id }}}}</td><td>{{{{ record.name }}}}</td></tr>
+  {{% endfor %}}
+</table>
+"""
+
+MARKDOWN_BODY = """
+# {title}
+
+{paragraph}
+
+## Details
+
+{paragraph}
+
+```python
+def page_{index}():
+    return {index}
+```
+
+- First item
+- Second item
+"""
+
+JINJA_BODY = """
+<h1>{{{{ data.title }}}}</h1>
+<p>{paragraph}</p>
+<ul>
+  {{% for record in data.{dataset}[:10] %}}
+    <li>{{{{ record.name }}}}</li>
+  {{% endfor %}}
+</ul>
+"""
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+
+def paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def get_directories(root: Path, depth: int, breadth: int = 3) -> List[Path]:
+    directories = [root]
+    level = [root]
+    for d in range(depth):
+        level = [
+            parent / f"section_{d}_{i}" for parent in level for i in range(breadth)
+        ]
+        directories += level
+    return directories
+
+
+def write_file(path: Path, content: str) -> None:
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, "w+") as outfile:
+        outfile.write(content)
+
+
+def write_page(path: Path, metadata: dict, body: str) -> None:
+    frontmatter = "".join(
+        f"{key}: {json.dumps(value)}\n" for key, value in metadata.items()
+    )
+    write_file(path, f"---\n{frontmatter}---\n{body}")
+
+
+def generate_site(
+    root: Path,
+    markdown_pages: int = 100,
+    jinja_pages: int = 100,
+    depth: int = 2,
+    data_files: int = 10,
+    data_size: int = 100,
+    tags: int = 10,
+    pagination_size: int = 10,
+    seed: int = 0,
+) -> None:
+    rng = random.Random(seed)
+    tag_names = [f"tag{i}" for i in range(tags)]
+
+    write_file(root / "templates" / "base.html", BASE_LAYOUT)
+    write_file(root / "templates" / "nav.html", NAV)
+
+    site = {
+        "name": "Benchmark",
+        "links": [{"url": f"/link/{i}/", "title": f"Link {i}"} for i in range(10)],
+    }
+    write_file(root / "data" / "site.json", json.dumps({"site": site}))
+
+    datasets = []
+    for i in range(data_files):
+        dataset = f"dataset{i}"
+        datasets.append(dataset)
+        records = [{"id": j, "name": paragraph(rng, 3)} for j in range(data_size)]
+        write_file(root / "data" / f"{dataset}.json", json.dumps({dataset: records}))
+
+    directories = get_directories(root, depth)
+    for i, directory in enumerate(directories[1:]):
+        write_file(
+            directory / "section.json",
+            json.dumps({"section": directory.name, "section_index": i}),
+        )
+
+    for i in range(markdown_pages):
+        metadata = {
+            "title": f"Post {i}",
+            "layout": "base.html",
+            "date": f"2021-{i % 12 + 1:02}-{i % 28 + 1:02}",
+        }
+        metadata["tags"] = ["posts", *rng.sample(tag_names, min(len(tag_names), 2))]
+        write_page(
+            rng.choice(directories) / f"post_{i}.md",
+            metadata,
+            MARKDOWN_BODY.format(title=f"Post {i}", paragraph=paragraph(rng), index=i),
+        )
+
+    for i in range(jinja_pages):
+        body = f"<h1>{{{{ data.title }}}}</h1>\n<p>{paragraph(rng)}</p>\n"
+        if datasets:
+            body = JINJA_BODY.format(
+                paragraph=paragraph(rng), dataset=rng.choice(datasets)
+            )
+        write_page(
+            rng.choice(directories) / f"page_{i}.html",
+            {"title": f"Page {i}", "layout": "base.html"},
+            body,
+        )
+
+    write_file(root / "index.html", INDEX_PAGE)
+    if pagination_size > 0:
+        for tag in tag_names:
+            write_file(
+                root / "tags" / f"{tag}.html",
+                TAG_PAGE.format(tag=tag, size=pagination_size),
+            )
+        if datasets:
+            write_file(
+                root / "records.html",
+                DATA_PAGE.format(dataset=datasets[0], size=pagination_size),
+            )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--markdown-pages", type=int, default=100)
+    parser.add_argument("--jinja-pages", type=int, default=100)
+    parser.add_argument("--depth", help="Directory nesting depth", type=int, default=2)
+    parser.add_argument("--data-files", type=int, default=10)
+    parser.add_argument(
+        "--data-size", help="Records per data file", type=int, default=100
+    )
+    parser.add_argument("--tags", help="Number of distinct tags", type=int, default=10)
+    parser.add_argument("--pagination-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def get_site_options(args: argparse.Namespace) -> dict:
+    return {
+        "markdown_pages": args.markdown_pages,
+        "jinja_pages": args.jinja_pages,
+        "depth": args.depth,
+        "data_files": args.data_files,
+        "data_size": args.data_size,
+        "tags": args.tags,
+        "pagination_size": args.pagination_size,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="Where to write the site")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    generate_site(Path(args.directory), **get_site_options(args))
+    print("Generated site in", args.directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from skip_ssg.cache import BuildCache, hash_strings
+from skip_ssg.profiler import profiler
+
+# From linux/fs.h, clones a file's extents on filesystems that support it
+FICLONE = 0x40049409
+# Cleared after the first failure, since most filesystems can't
+_can_reflink = sys.platform.startswith("linux")
+
+# Characters of the content hash that go into fingerprinted names
+FINGERPRINT_LENGTH = 8
+DEFAULT_MANIFEST = "asset-manifest.json"
+
+# Content hashes by (path, size, mtime), kept between watch mode builds
+_content_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def get_copy_targets(
+    copy: Iterable[str], site_dir: Path
+) -> Iterator[Tuple[Path, Path]]:
+    """Split "src:dest" copy options into their source and their destination
+    relative to site_dir"""
+    for copy_target in copy:
+        if ":" in copy_target:
+            src, dest = map(Path, copy_target.split(":"))
+        else:
+            src = dest = Path(copy_target)
+        if not src.is_dir() and (dest == Path() or (site_dir / dest).is_dir()):
+            # Files copied to a directory keep their name
+            dest = dest / src.name
+        yield src, dest
+
+
+def iter_files(src: Path) -> Iterator[Path]:
+    """Every file under src, relative to it, or just src if it's a file"""
+    if not src.is_dir():
+        yield Path()
+        return
+
+    for root, _, files in os.walk(src):
+        for file in files:
+            yield Path(root, file).relative_to(src)
+
+
+def reflink(src: Path, dest: Path) -> bool:
+    global _can_reflink
+    if not _can_reflink:
+        return False
+
+    import fcntl
+
+    with open(src, "rb") as infile, open(dest, "wb") as outfile:
+        try:
+            fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+        except OSError:
+            _can_reflink = False
+            return False
+    return True
+
+
+def is_unchanged(src_stat: os.stat_result, dest_stat: os.stat_result) -> bool:
+    return (
+        src_stat.st_size == dest_stat.st_size
+        and src_stat.st_mtime_ns == dest_stat.st_mtime_ns
+    )
+
+
+def sync_file(src: Path, dest: Path, link: bool = False) -> bool:
+    """Make dest a copy of src unless it already has the same size and mtime,
+    returning whether it was copied"""
+    src_stat = os.stat(src)
+    try:
+        dest_stat: Optional[os.stat_result] = os.stat(dest)
+    except FileNotFoundError:
+        dest_stat = None
+    if dest_stat is not None and is_unchanged(src_stat, dest_stat):
+        return False
+
+    if dest_stat is None:
+        os.makedirs(dest.parent, exist_ok=True)
+    else:
+        # Never write through a hard link into the source
+        os.unlink(dest)
+
+    if link:
+        try:
+            os.link(src, dest)
+            return True
+        except OSError:
+            pass
+
+    if not reflink(src, dest):
+        shutil.copyfile(src, dest)
+    # Copying the mtime is what lets the next build skip the file
+    shutil.copystat(src, dest)
+    return True
+
+
+class AssetSync:
+    """Copies the --copy targets into the site in background threads
+
+    Only files whose size or mtime differ from the copy already in the site are
+    copied, and files the sources no longer have are removed afterwards.
+    """
+
+    def __init__(
+        self,
+        site_dir: Path,
+        jobs: int = 8,
+        link: bool = False,
+        manifest: Optional["AssetManifest"] = None,
+    ) -> None:
+        self.site_dir = site_dir
+        self.link = link
+        self.manifest = manifest
+        self.executor = ThreadPoolExecutor(max(1, jobs))
+        self.targets: List[Future] = []
+        self.expected: Set[Path] = set()
+        self.dest_dirs: List[Path] = []
+        self.copied: Set[Path] = set()
+        self.unchanged = 0
+
+    def start(
+        self,
+        targets: Iterable[Tuple[Path, Path]],
+        unchanged: Iterable[Tuple[Path, Path]] = (),
+    ) -> None:
+        """Copy targets. The files of unchanged targets are only listed, so
+        remove_stale keeps them when their destinations overlap"""
+        for src, dest in targets:
+            dest = self.site_dir / dest
+            print(f"Copying {src} to {dest}")
+            if src.is_dir():
+                self.dest_dirs.append(dest)
+            self.targets.append(self.executor.submit(self.plan, src, dest))
+        for src, dest in unchanged:
+            self.targets.append(
+                self.executor.submit(self.plan, src, self.site_dir / dest, False)
+            )
+
+    def plan(
+        self, src: Path, dest: Path, copy: bool = True
+    ) -> List[Tuple[Path, Optional[Future]]]:
+        # Walking a big tree takes a while too, so it happens in the pool as well
+        planned = []
+        for path in iter_files(src):
+            output = dest / path
+            if self.manifest is not None:
+                output = self.site_dir / self.manifest.resolve(
+                    output.relative_to(self.site_dir)
+                )
+            future = None
+            if copy:
+                future = self.executor.submit(self.sync, src / path, output)
+            planned.append((output, future))
+        return planned
+
+    def sync(self, src: Path, dest: Path) -> bool:
+        with profiler.measure("copy", str(src)):
+            return sync_file(src, dest, self.link)
+
+    def wait(self) -> Set[Path]:
+        """Wait for all copies to finish, returning the files that were copied"""
+        try:
+            for target in self.targets:
+                for dest, future in target.result():
+                    self.expected.add(dest)
+                    if future is None:
+                        continue
+                    if future.result():
+                        self.copied.add(dest)
+                    else:
+                        self.unchanged += 1
+        finally:
+            self.executor.shutdown()
+        return self.copied
+
+    def remove_stale(self, keep: Set[Path]) -> List[Path]:
+        """Delete files under the copied directories that their sources no longer
+        have, apart from those in keep, like the pages that were just written"""
+        removed = []
+        for dest_dir in self.dest_dirs:
+            for root, _, files in os.walk(dest_dir):
+                for file in files:
+                    path = Path(root, file)
+                    if path not in self.expected and path not in keep:
+                        os.remove(path)
+                        removed.append(path)
+        return removed
+
+
+def hash_content(path: Path, cache: Optional[BuildCache] = None) -> str:
+    """The sha256 of a file, reused while its size and mtime stay the same"""
+    stat = os.stat(path)
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key in _content_hashes:
+        return _content_hashes[key]
+
+    cache_key = hash_strings([str(part) for part in key])
+    digest = cache.get("assets", cache_key) if cache is not None else None
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as infile:
+            for block in iter(lambda: infile.read(1024 * 1024), b""):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        if cache is not None:
+            cache.set("assets", cache_key, digest)
+
+    _content_hashes[key] = digest
+    return digest
+
+
+def fingerprint_path(path: Path, digest: str) -> Path:
+    """style.css becomes style.<hash>.css"""
+    return path.with_name(f"{path.stem}.{digest[:FINGERPRINT_LENGTH]}{path.suffix}")
+
+
+class AssetManifest:
+    """Maps the site paths of fingerprinted files to their hashed names
+
+    Templates call it through the asset() global to link to the current version of
+    a file.
+    """
+
+    def __init__(self, cache: Optional[BuildCache] = None) -> None:
+        self.cache = cache
+        self.paths: Dict[str, str] = {}
+
+    def add(self, src: Path, dest: Path) -> None:
+        """Fingerprint every file of a copy target, with dest relative to the site"""
+        for path in iter_files(src):
+            with profiler.measure("copy", str(src / path)):
+                digest = hash_content(src / path, self.cache)
+            self.paths[(dest / path).as_posix()] = fingerprint_path(
+                dest / path, digest
+            ).as_posix()
+
+    def resolve(self, path: Path) -> Path:
+        """Where a file copied to path, relative to the site, actually goes"""
+        return Path(self.paths.get(path.as_posix(), path))
+
+    def __call__(self, path: str) -> str:
+        path = path.lstrip("/")
+        return "/" + self.paths.get(path, path)
+
+    def get_cache_key(self, cache: BuildCache) -> Any:
+        return self.paths
+
+    def to_json(self) -> str:
+        return json.dumps(self.paths, indent=2, sort_keys=True)
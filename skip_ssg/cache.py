@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+DEFAULT_CACHE_DIR = ".skip-cache"
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def hash_bytes(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_strings(parts: Iterable[str]) -> str:
+    return hash_bytes(*(part.encode() for part in parts))
+
+
+class BuildCache:
+    """Pickled build artifacts stored on disk, keyed by content hashes
+
+    Entries are namespaced, and the least recently used ones are evicted by prune
+    once the cache grows past max_size bytes. A fresh BuildCache should be created
+    for every build, since fingerprints of in-memory objects are memoised by id.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_size = max_size
+        # Memoised objects are kept alive so their ids can't be reused
+        self._fingerprints: Dict[int, Tuple[Any, Optional[str]]] = {}
+        self._file_hashes: Dict[Path, Optional[str]] = {}
+
+    def _entry_path(self, namespace: str, key: str) -> Path:
+        return self.directory / namespace / key[:2] / key
+
+    def get(self, namespace: str, key: str) -> Any:
+        path = self._entry_path(namespace, key)
+        try:
+            with open(path, "rb") as infile:
+                value = pickle.load(infile)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Bump the mtime so eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        path = self._entry_path(namespace, key)
+        os.makedirs(path.parent, exist_ok=True)
+
+        # Write then rename so concurrent builds never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as outfile:
+                pickle.dump(value, outfile)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def prune(self) -> None:
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def hash_file(self, path: Path) -> Optional[str]:
+        if path not in self._file_hashes:
+            try:
+                with open(path, "rb") as infile:
+                    self._file_hashes[path] = hash_bytes(infile.read())
+            except OSError:
+                self._file_hashes[path] = None
+        return self._file_hashes[path]
+
+    def _json_default(self, obj: Any) -> Any:
+        get_cache_key = getattr(obj, "get_cache_key", None)
+        if callable(get_cache_key):
+            return get_cache_key(self)
+        if isinstance(obj, Mapping):
+            return dict(obj)
+        if isinstance(obj, (set, frozenset)):
+            return sorted(repr(item) for item in obj)
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        # Anything else might hide state from its repr, so it isn't cacheable
+        raise TypeError(f"Cannot fingerprint {type(obj)}")
+
+    def fingerprint(self, obj: Any, memoise: bool = False) -> Optional[str]:
+        """Hash arbitrary template data, or None if it can't be hashed reliably
+
+        Pass memoise for objects that are shared by many pages, like the data
+        inherited from a directory or a collection.
+        """
+        if memoise and id(obj) in self._fingerprints:
+            return self._fingerprints[id(obj)][1]
+
+        try:
+            serialised = json.dumps(obj, sort_keys=True, default=self._json_default)
+        except (TypeError, ValueError):
+            fingerprint = None
+        else:
+            fingerprint = hash_strings([serialised])
+
+        if memoise:
+            self._fingerprints[id(obj)] = (obj, fingerprint)
+        return fingerprint
@@ -0,0 +1,148 @@
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+)
+
+from skip_ssg.cache import BuildCache
+from skip_ssg.dependencies import date_reads
+
+
+class Collection(Sequence):
+    """Pages sharing a tag, oldest first
+
+    Slicing returns plain lists, and the indexes below are only worked out the first
+    time a template asks for them.
+    """
+
+    def __init__(self, pages: List[Any]) -> None:
+        self._pages = pages
+        self._positions: Optional[Dict[int, int]] = None
+        self._by_year: Optional[Dict[int, List[Any]]] = None
+        self._tag_counts: Optional[Dict[str, int]] = None
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        return self._pages[index]
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._pages)
+
+    def __reversed__(self) -> Iterator[Any]:
+        return reversed(self._pages)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Collection):
+            other = other._pages
+        return self._pages == other
+
+    def __repr__(self) -> str:
+        return f"Collection({self._pages!r})"
+
+    def reverse(self) -> List[Any]:
+        """The pages newest first, leaving the collection as it is"""
+        return self._pages[::-1]
+
+    @property
+    def by_year(self) -> Dict[int, List[Any]]:
+        # Only reads the dates the first time, but every page using it depends on them
+        date_reads.read = True
+        if self._by_year is None:
+            self._by_year = {}
+            for page in self._pages:
+                self._by_year.setdefault(page.date.year, []).append(page)
+        return self._by_year
+
+    @property
+    def tag_counts(self) -> Dict[str, int]:
+        """How many of the pages have each tag, most common first"""
+        if self._tag_counts is None:
+            counts: Dict[str, int] = {}
+            for page in self._pages:
+                for tag in page.tags:
+                    counts[tag] = counts.get(tag, 0) + 1
+            self._tag_counts = dict(
+                sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            )
+        return self._tag_counts
+
+    def position(self, page: Any) -> Optional[int]:
+        # Templates get the SitePage, so also accept those
+        page = getattr(page, "source", page)
+        if self._positions is None:
+            self._positions = {id(item): i for i, item in enumerate(self._pages)}
+        return self._positions.get(id(page))
+
+    def previous(self, page: Any) -> Any:
+        """The page before page in the collection, or None"""
+        position = self.position(page)
+        if position is None or position == 0:
+            return None
+        return self._pages[position - 1]
+
+    def next(self, page: Any) -> Any:
+        """The page after page in the collection, or None"""
+        position = self.position(page)
+        if position is None or position + 1 >= len(self._pages):
+            return None
+        return self._pages[position + 1]
+
+    def get_cache_key(self, cache: BuildCache) -> List[Any]:
+        return self._pages
+
+
+class Collections(Mapping):
+    """Every page of a build grouped by tag, plus "all"
+
+    The pages are only sorted when a collection is first looked up, so builds whose
+    templates don't use collections never pay for it. Looking up a tag no page has
+    gives an empty collection.
+    """
+
+    def __init__(self, pages: Iterable[Any]) -> None:
+        self._pages = list(pages)
+        self._names: Set[str] = {"all"}
+        for page in self._pages:
+            self._names |= page.tags
+        self._collections: Optional[Dict[str, Collection]] = None
+
+    def _sort(self) -> Dict[str, Collection]:
+        if self._collections is None:
+            # Sort once, then every tag's collection comes out in order as it's
+            # filled
+            pages = sorted(self._pages, key=lambda page: page.timestamp)
+            members: Dict[str, List[Any]] = {name: [] for name in self._names}
+            for page in pages:
+                members["all"].append(page)
+                for tag in page.tags:
+                    members[tag].append(page)
+            self._collections = {
+                name: Collection(pages) for name, pages in members.items()
+            }
+        return self._collections
+
+    def __getitem__(self, name: str) -> Collection:
+        if name not in self._names:
+            return Collection([])
+        return self._sort()[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self[name] if name in self._names else default
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._names))
+
+    def __len__(self) -> int:
+        return len(self._names)
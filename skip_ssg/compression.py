@@ -0,0 +1,94 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import gzip
+import os
+from pathlib import Path
+import tempfile
+from typing import Callable, Dict, List
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+
+# Sidecar suffixes and how to make them. zlib and brotli both release the GIL, so
+# threads are enough to compress in parallel
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    # mtime=0 keeps the output identical for identical pages
+    ".gz": lambda content: gzip.compress(content, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORS[".br"] = brotli.compress
+
+SIDECAR_SUFFIXES = [".gz", ".br"]
+
+
+def get_sidecars(path: Path) -> List[Path]:
+    return [path.with_name(path.name + suffix) for suffix in SIDECAR_SUFFIXES]
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    # The server could be reading the old sidecar while it's replaced
+    fd, temp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def compress_page(path: Path, content: bytes, min_size: int = DEFAULT_MIN_SIZE) -> None:
+    """Write the compressed sidecars of a page, or remove them if it's too small to
+    be worth it"""
+    if len(content) < min_size:
+        remove_sidecars(path)
+        return
+
+    for suffix, compress in COMPRESSORS.items():
+        write_atomic(path.with_name(path.name + suffix), compress(content))
+
+
+def remove_sidecars(path: Path) -> None:
+    for sidecar in get_sidecars(path):
+        try:
+            os.remove(sidecar)
+        except FileNotFoundError:
+            pass
+
+
+class Compressor:
+    """Compresses pages in background threads while the build carries on"""
+
+    def __init__(self, jobs: int = 4, min_size: int = DEFAULT_MIN_SIZE) -> None:
+        self.min_size = min_size
+        self.executor = ThreadPoolExecutor(max(1, jobs))
+        self.futures: List[Future] = []
+
+    def is_missing(self, path: Path, size: int) -> bool:
+        """Whether a page that wasn't rewritten still needs its sidecars, because
+        they don't exist or are older than it, like after a build without them"""
+        if size < self.min_size:
+            return False
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            return any(
+                os.stat(path.with_name(path.name + suffix)).st_mtime_ns < mtime_ns
+                for suffix in COMPRESSORS
+            )
+        except FileNotFoundError:
+            return True
+
+    def submit(self, path: Path, content: bytes) -> None:
+        self.futures.append(
+            self.executor.submit(compress_page, path, content, self.min_size)
+        )
+
+    def wait(self) -> None:
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.executor.shutdown()
@@ -0,0 +1,249 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import pickle
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from skip_ssg.cache import BuildCache, hash_bytes, hash_strings
+from skip_ssg.profiler import profiler
+from skip_ssg.sources import DataFile, PythonFile
+
+MISSING = object()
+
+
+def is_reusable(data: Any) -> bool:
+    """Whether data can be used by more than one build, unlike iterators such as
+    generators, which the first build uses up"""
+    if isinstance(data, Iterator):
+        return False
+    if isinstance(data, Mapping):
+        return not any(isinstance(value, Iterator) for value in data.values())
+    return True
+
+
+class DataCache:
+    """Remembers loaded data between builds
+
+    JSON files are reused until their mtime or size changes. Python files are
+    keyed by a hash of their source and only cached when they declare CACHE_TTL
+    (in seconds) or a default ttl is given, since their data usually comes from
+    elsewhere. Entries live in memory, so they survive watch mode rebuilds, and can
+    also be persisted in the build cache for cold builds.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Path, Tuple[str, Optional[float], Any]] = {}
+
+    def get_key(self, data_file: DataFile) -> Optional[str]:
+        try:
+            if isinstance(data_file, PythonFile):
+                with open(data_file.path, "rb") as infile:
+                    return hash_bytes(infile.read())
+            stat = os.stat(data_file.path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def get(
+        self,
+        data_file: DataFile,
+        key: str,
+        persistent_cache: Optional[BuildCache] = None,
+    ) -> Any:
+        entry = self.entries.get(data_file.path)
+        if entry is None and persistent_cache is not None:
+            entry = persistent_cache.get(
+                "data", hash_strings([str(data_file.path), key])
+            )
+        if entry is None:
+            return MISSING
+
+        entry_key, expires_at, data = entry
+        if entry_key != key or (expires_at is not None and time.time() > expires_at):
+            self.entries.pop(data_file.path, None)
+            return MISSING
+
+        self.entries[data_file.path] = entry
+        return data
+
+    def set(
+        self,
+        data_file: DataFile,
+        key: str,
+        data: Any,
+        default_ttl: Optional[float] = None,
+        persistent_cache: Optional[BuildCache] = None,
+    ) -> None:
+        if not is_reusable(data):
+            return
+
+        expires_at = None
+        if isinstance(data_file, PythonFile):
+            ttl = (
+                data_file.cache_ttl if data_file.cache_ttl is not None else default_ttl
+            )
+            if ttl is None or ttl <= 0:
+                return
+            expires_at = time.time() + ttl
+
+        entry = (key, expires_at, data)
+        self.entries[data_file.path] = entry
+        if persistent_cache is not None and isinstance(data_file, PythonFile):
+            try:
+                persistent_cache.set(
+                    "data", hash_strings([str(data_file.path), key]), entry
+                )
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # Not everything a data file returns can be pickled
+                pass
+
+
+# Shared by every build in the process, so watch mode can reuse data
+data_cache = DataCache()
+
+# Only used to hash data, so it never touches the cache directory
+_hasher = BuildCache()
+
+
+def fingerprint_data(data: Any) -> Optional[str]:
+    """Hash loaded data, or None if it can't be compared with another build's"""
+    if not is_reusable(data):
+        return None
+    return _hasher.fingerprint(data)
+
+
+class DataLoader:
+    """Loads and merges data files
+
+    Python data files that define an async get_data, or set THREADED = True to run
+    a blocking get_data in a thread, are loaded concurrently, at most concurrency
+    at a time. Results are always merged in the order the files were given.
+
+    The data of every Python file that was actually loaded, rather than reused from
+    the cache, is fingerprinted in fingerprints, so a rebuild can tell whether it
+    changed.
+    """
+
+    def __init__(
+        self,
+        fail_on_error: bool = False,
+        concurrency: int = 8,
+        timeout: Optional[float] = None,
+        cache: Optional[DataCache] = None,
+        default_ttl: Optional[float] = None,
+        persistent_cache: Optional[BuildCache] = None,
+    ) -> None:
+        self.fail_on_error = fail_on_error
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.cache = cache
+        self.default_ttl = default_ttl
+        self.persistent_cache = persistent_cache
+        self.fingerprints: Dict[Path, Optional[str]] = {}
+
+    def load(self, data_files: List[DataFile]) -> Dict:
+        keys: List[Optional[str]] = [None] * len(data_files)
+        results: List[Any] = [MISSING] * len(data_files)
+        if self.cache is not None:
+            for i, data_file in enumerate(data_files):
+                keys[i] = self.cache.get_key(data_file)
+                if keys[i] is not None:
+                    results[i] = self.cache.get(
+                        data_file, keys[i], self.persistent_cache
+                    )
+
+        pending = [i for i, result in enumerate(results) if result is MISSING]
+        pending_files = [data_files[i] for i in pending]
+        if self.timeout is None and not any(
+            isinstance(data_file, PythonFile) for data_file in pending_files
+        ):
+            # Nothing could run concurrently, so skip starting an event loop
+            loaded = [self.load_file(data_file) for data_file in pending_files]
+        else:
+            loaded = asyncio.run(self.load_files(pending_files))
+
+        for i, file_data in zip(pending, loaded):
+            results[i] = file_data
+            if isinstance(data_files[i], PythonFile):
+                self.fingerprints[data_files[i].path] = (
+                    None
+                    if isinstance(file_data, Exception)
+                    else fingerprint_data(file_data)
+                )
+            if (
+                self.cache is not None
+                and keys[i] is not None
+                and not isinstance(file_data, Exception)
+            ):
+                self.cache.set(
+                    data_files[i],
+                    keys[i],
+                    file_data,
+                    self.default_ttl,
+                    self.persistent_cache,
+                )
+
+        data: Dict = {}
+        for data_file, file_data in zip(data_files, results):
+            if isinstance(file_data, Exception):
+                if not self.fail_on_error:
+                    print(
+                        f'Failed to load data from {data_file.path}: "{file_data}", '
+                        "skipping..."
+                    )
+                    continue
+                else:
+                    raise file_data
+
+            if not isinstance(file_data, Dict):
+                file_data = {data_file.path.stem: file_data}
+
+            data.update(file_data)
+        return data
+
+    def load_file(self, data_file: DataFile) -> Any:
+        try:
+            with profiler.measure("data", str(data_file.path)):
+                return data_file.get_data()
+        except Exception as e:
+            return e
+
+    async def load_files(self, data_files: List[DataFile]) -> List[Any]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(self.concurrency)
+        try:
+            return await asyncio.gather(
+                *(
+                    self.load_file_async(data_file, semaphore, executor)
+                    for data_file in data_files
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            # Threads can't be cancelled, so don't let one that timed out hold up
+            # the build
+            executor.shutdown(wait=False)
+
+    async def load_file_async(
+        self,
+        data_file: DataFile,
+        semaphore: asyncio.Semaphore,
+        executor: ThreadPoolExecutor,
+    ) -> Any:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                # wait_for can't interrupt get_data functions running on the event
+                # loop, so they go to the executor when there's a timeout
+                return await asyncio.wait_for(
+                    data_file.get_data_async(executor, self.timeout is not None),
+                    self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Timed out after {self.timeout}s")
+            finally:
+                profiler.record(
+                    "data", str(data_file.path), start, time.perf_counter() - start
+                )
@@ -0,0 +1,212 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Set
+
+import jinja2
+from jinja2 import meta
+
+TEMPLATES_DIR = Path("templates")
+
+
+class TrackedCollections(Mapping):
+    """Read-only view over the collections that records which ones get used"""
+
+    def __init__(self, collections: Mapping) -> None:
+        self._collections = collections
+        self.accessed: Set[str] = set()
+        self.accessed_all = False
+
+    def __getitem__(self, key: str) -> Any:
+        self.accessed.add(key)
+        return self._collections[key]
+
+    def __contains__(self, key: object) -> bool:
+        # Mapping's version goes through __getitem__, and missing tags get an empty
+        # collection rather than a KeyError
+        self.accessed.add(key)
+        return key in self._collections
+
+    def __iter__(self) -> Iterator[str]:
+        # Iterating means any collection, including ones that don't exist yet,
+        # could be used
+        self.accessed_all = True
+        return iter(self._collections)
+
+    def __len__(self) -> int:
+        return len(self._collections)
+
+
+class DateReads:
+    """Records whether any page's date was read since the last reset
+
+    Pages without a date in their frontmatter are dated by their file's mtime, which
+    a fresh checkout changes, so only pages whose templates read dates depend on it.
+    """
+
+    def __init__(self) -> None:
+        self.read = False
+
+    def reset(self) -> None:
+        self.read = False
+
+
+# Pages render one at a time in each process, so they can share one
+date_reads = DateReads()
+
+
+class TrackedPages(Mapping):
+    """View over the pages of a build by URL
+
+    Any page could be looked up, so using it counts as using the "all" collection.
+    """
+
+    def __init__(self, pages: Mapping, collections: TrackedCollections) -> None:
+        self._pages = pages
+        self._collections = collections
+
+    def __getitem__(self, url: str) -> Any:
+        self._collections.accessed.add("all")
+        return self._pages[url]
+
+    def __iter__(self) -> Iterator[str]:
+        self._collections.accessed.add("all")
+        return iter(self._pages)
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+
+class TemplateDependencies:
+    """Statically resolves the templates a template (transitively) pulls in
+
+    Results are memoised per template name, so each layout is only parsed once per
+    build no matter how many pages use it.
+    """
+
+    def __init__(self, jinja2_env: jinja2.Environment) -> None:
+        self.jinja2_env = jinja2_env
+        self._cache: Dict[str, Optional[Set[str]]] = {}
+
+    def of_template(self, name: str) -> Optional[Set[str]]:
+        """Return the names of all templates used by name, including itself, or None
+        if any of them are chosen dynamically"""
+        if name in self._cache:
+            return self._cache[name]
+
+        # Guard against cycles while we recurse
+        self._cache[name] = {name}
+        try:
+            source, _, _ = self.jinja2_env.loader.get_source(self.jinja2_env, name)
+        except jinja2.TemplateNotFound:
+            return self._cache[name]
+
+        dependencies = self.of_source(source)
+        self._cache[name] = None if dependencies is None else {name, *dependencies}
+        return self._cache[name]
+
+    def of_source(self, source: str) -> Optional[Set[str]]:
+        try:
+            ast = self.jinja2_env.parse(source)
+        except jinja2.TemplateSyntaxError:
+            return set()
+
+        dependencies: Set[str] = set()
+        for name in meta.find_referenced_templates(ast):
+            if name is None:
+                return None
+            referenced = self.of_template(name)
+            if referenced is None:
+                return None
+            dependencies |= referenced
+        return dependencies
+
+
+class PageDependencies:
+    """Everything a single output page was built from"""
+
+    def __init__(
+        self,
+        source: Path,
+        data_sources: Iterable[Path],
+        templates: Optional[Set[str]],
+        collections: Set[str],
+        all_collections: bool = False,
+        dates: bool = False,
+    ) -> None:
+        self.source = source
+        self.data_sources = set(data_sources)
+        # None means the page uses a dynamically chosen template, so it depends on
+        # every template
+        self.templates = (
+            None if templates is None else {TEMPLATES_DIR / name for name in templates}
+        )
+        self.collections = collections
+        self.all_collections = all_collections
+        # Whether the page's HTML used the date of a page
+        self.dates = dates
+
+    def is_affected(
+        self, changed_paths: Set[Path], changed_collections: Set[str]
+    ) -> bool:
+        if self.source in changed_paths:
+            return True
+        if self.data_sources & changed_paths:
+            return True
+
+        if self.templates is None:
+            if any(TEMPLATES_DIR in path.parents for path in changed_paths):
+                return True
+        elif self.templates & changed_paths:
+            return True
+
+        if changed_collections and (
+            self.all_collections or self.collections & changed_collections
+        ):
+            return True
+
+        return False
+
+
+class DependencyGraph:
+    """Maps every output page of a build to the sources it depended on"""
+
+    def __init__(self) -> None:
+        self.outputs: Dict[Path, PageDependencies] = {}
+        self.tags: Dict[Path, Set[str]] = {}
+        # What the build actually changed in the output directory
+        self.written: Set[Path] = set()
+        self.copied: Set[Path] = set()
+        # Fingerprinted asset paths, which every page could link to
+        self.assets: Dict[str, str] = {}
+        # Fingerprints of what Python data files returned, which can change without
+        # the files themselves changing
+        self.data: Dict[Path, Optional[str]] = {}
+
+    def add_page(self, output: Path, dependencies: PageDependencies) -> None:
+        self.outputs[output] = dependencies
+
+    def add_source(self, source: Path, tags: Set[str]) -> None:
+        self.tags[source] = set(tags)
+
+    def get_changed_collections(
+        self,
+        changed_paths: Set[Path],
+        tags: Mapping[Path, Set[str]],
+        data_sources: Optional[Mapping[Path, Iterable[Path]]] = None,
+    ) -> Set[str]:
+        """Collections whose members were added, removed or edited
+
+        tags maps the page sources of the current build to their tags, so both pages
+        that just appeared and pages that just disappeared are accounted for.
+        data_sources maps them to the data files they use, since editing one of
+        those changes the data of every page in the collections built from them.
+        """
+        changed: Set[str] = set()
+        for source_tags in (self.tags, tags):
+            for source in changed_paths & source_tags.keys():
+                changed.add("all")
+                changed |= source_tags[source]
+        for source, sources in (data_sources or {}).items():
+            if not changed_paths.isdisjoint(sources):
+                changed.add("all")
+                changed |= tags.get(source, set())
+        return changed
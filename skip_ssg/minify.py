@@ -0,0 +1,142 @@
+import inspect
+from pathlib import Path
+import re
+from typing import Callable, List, Optional
+
+from skip_ssg.cache import BuildCache, hash_strings
+from skip_ssg.profiler import profiler
+
+# Outputs that get minified, other permalinks like feeds are left alone
+MINIFIED_SUFFIXES = {".html", ".htm"}
+
+# Elements whose contents can't be touched, or that get minified as CSS or JS
+_RAW_ELEMENT = re.compile(
+    r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Keeps conditional comments, which old browsers act on
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_WHITESPACE = re.compile(r"\s+")
+# Whitespace next to these tags never renders, unlike whitespace between inline
+# elements like <a> or <span>
+_BLOCK_TAG = re.compile(
+    r"\s*(</?(?:html|head|body|title|meta|link|base|script|style|noscript|div|p|"
+    r"section|article|aside|header|footer|nav|main|h[1-6]|hr|br|ul|ol|li|dl|dt|dd|"
+    r"table|thead|tbody|tfoot|tr|td|th|caption|colgroup|col|form|fieldset|legend|"
+    r"figure|figcaption|blockquote|details|summary|option|!doctype)\b[^>]*>)\s*",
+    re.IGNORECASE,
+)
+_JS_TYPES = {"", "text/javascript", "application/javascript", "module"}
+_SCRIPT_TYPE = re.compile(r"""\btype\s*=\s*["']?([^"'\s>]*)""", re.IGNORECASE)
+
+# Strings are matched along with comments so neither is mistaken for the other
+_CSS_STRING_OR_COMMENT = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.DOTALL
+)
+# No space before ":" since "a :hover" and "a:hover" are different selectors
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+
+
+def minify_css(css: str) -> str:
+    # Splitting leaves code at even indexes, then strings, or None for comments
+    parts = _CSS_STRING_OR_COMMENT.split(css)
+    for i in range(0, len(parts), 2):
+        part = _WHITESPACE.sub(" ", parts[i])
+        part = _CSS_PUNCTUATION.sub(lambda match: match.group(1) or ":", part)
+        parts[i] = part.replace(";}", "}")
+    return "".join(part or "" for part in parts).strip()
+
+
+def minify_js(js: str) -> str:
+    """Trim indentation and blank lines
+
+    Anything more needs a real parser, since comments and whitespace can't be told
+    apart from strings and regular expressions, and newlines end statements.
+    """
+    return "\n".join(line.strip() for line in js.splitlines() if line.strip())
+
+
+def _minify_raw(match: "re.Match[str]") -> str:
+    start, name, content, end = match.groups()
+    name = name.lower()
+    if name == "style":
+        content = minify_css(content)
+    elif name == "script":
+        script_type = _SCRIPT_TYPE.search(start)
+        if script_type is None or script_type.group(1).lower() in _JS_TYPES:
+            content = minify_js(content)
+    return start + content + end
+
+
+def minify_html(html: str) -> str:
+    """Remove comments and collapse whitespace, minifying inline CSS and JS
+
+    Whitespace between inline elements is kept as a single space, and the contents
+    of <pre> and <textarea> are left exactly as they are.
+    """
+    parts: List[str] = []
+    position = 0
+    strip_start = False
+    for match in _RAW_ELEMENT.finditer(html):
+        # <script> and <style> never render, so neither does whitespace around them
+        invisible = match.group(2).lower() in {"script", "style"}
+        text = _minify_text(html[position : match.start()])
+        text = text.lstrip() if strip_start else text
+        parts.append(text.rstrip() if invisible else text)
+        parts.append(_minify_raw(match))
+        position = match.end()
+        strip_start = invisible
+    text = _minify_text(html[position:])
+    parts.append(text.lstrip() if strip_start else text)
+    return "".join(parts).strip()
+
+
+def _minify_text(html: str) -> str:
+    html = _WHITESPACE.sub(" ", _COMMENT.sub("", html))
+    return _BLOCK_TAG.sub(r"\1", html)
+
+
+class Minifier:
+    """Runs a minify function over rendered pages, caching its output by the hash
+    of the page it was given, so unchanged pages aren't minified again"""
+
+    def __init__(
+        self,
+        minify: Callable[[str], str] = minify_html,
+        cache: Optional[BuildCache] = None,
+    ) -> None:
+        self.minify = minify
+        self.cache = cache
+        self.version = self.get_version()
+
+    def get_version(self) -> str:
+        # Editing the function's module invalidates everything it minified
+        parts = [
+            getattr(self.minify, "__module__", ""),
+            getattr(self.minify, "__qualname__", type(self.minify).__qualname__),
+        ]
+        if self.cache is not None:
+            try:
+                source = inspect.getsourcefile(self.minify)
+            except TypeError:
+                source = None
+            if source is not None:
+                parts.append(self.cache.hash_file(Path(source)) or "")
+        return hash_strings(parts)
+
+    def applies_to(self, path: Path) -> bool:
+        return path.suffix in MINIFIED_SUFFIXES
+
+    def __call__(self, html: str, name: str = "") -> str:
+        key = None
+        if self.cache is not None:
+            key = hash_strings([self.version, html])
+            minified = self.cache.get("minified", key)
+            if minified is not None:
+                return minified
+
+        with profiler.measure("minify", name):
+            minified = self.minify(html)
+        if key is not None:
+            self.cache.set("minified", key, minified)
+        return minified
@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import (
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from skip_ssg.profiler import profiler
+from skip_ssg.sources import PageFile, SitePage
+
+Key = TypeVar("Key")
+
+
+class PermalinkCollisionException(Exception):
+    pass
+
+
+class IndexedPages(Mapping, Generic[Key]):
+    """Pages by path or URL, built again from their page file whenever one is
+    looked up, so the pages of a big pagination don't stay in memory"""
+
+    def __init__(self, collections: Mapping[str, Sequence]) -> None:
+        self.collections = collections
+        # The page file and page number each page comes from, and its output path
+        self.locations: Dict[Key, Tuple[PageFile, int, Path]] = {}
+
+    def __getitem__(self, key: Key) -> SitePage:
+        page_file, number, path = self.locations[key]
+        page = page_file.get_page(self.collections, number)
+        # Already resolved, so the permalink isn't rendered again
+        page.path = path
+        return page
+
+    def __iter__(self) -> Iterator[Key]:
+        return iter(self.locations)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+
+class PermalinkIndex:
+    """Every page of the build, resolved to its output path before rendering"""
+
+    def __init__(self, collections: Mapping[str, Sequence]) -> None:
+        self.collections = collections
+        self.pages_by_path: IndexedPages[Path] = IndexedPages(collections)
+        self.pages_by_url: IndexedPages[str] = IndexedPages(collections)
+        self.paths_by_source: Dict[Path, List[Path]] = {}
+
+    def add(self, page: SitePage, number: int) -> None:
+        with profiler.measure("permalink", str(page.source.path)):
+            path = page.get_path()
+            url = page.get_permalink()
+
+        if path in self.pages_by_path:
+            other = self.pages_by_path.locations[path][0]
+            raise PermalinkCollisionException(
+                f"{page.source.path} and {other.path} both output to {path}"
+            )
+
+        self.pages_by_path.locations[path] = (page.source, number, path)
+        self.pages_by_url.locations[url] = (page.source, number, path)
+        self.paths_by_source.setdefault(page.source.path, []).append(path)
+
+    def get_pages(self, page_file: PageFile) -> Optional[Iterator[SitePage]]:
+        """The pages of page_file, or None if they weren't indexed"""
+        paths = self.paths_by_source.get(page_file.path)
+        if paths is None:
+            return None
+        return self.iter_pages(page_file, paths)
+
+    def iter_pages(self, page_file: PageFile, paths: List[Path]) -> Iterator[SitePage]:
+        for page, path in zip(page_file.get_pages(self.collections), paths):
+            # Already resolved, so the permalink isn't rendered a second time
+            page.path = path
+            yield page
+
+
+def get_permalink_index(
+    page_files: Iterable[PageFile], collections: Mapping[str, Sequence]
+) -> PermalinkIndex:
+    index = PermalinkIndex(collections)
+    for page_file in page_files:
+        # Paginating a generator here would use it up, so those pages are left to
+        # be streamed while rendering, and checked for collisions as they're written
+        if page_file.is_streamed(collections):
+            continue
+        index.paths_by_source[page_file.path] = []
+        for number, page in enumerate(page_file.get_pages(collections)):
+            index.add(page, number)
+    return index
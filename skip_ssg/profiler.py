@@ -0,0 +1,140 @@
+from collections import defaultdict
+import contextlib
+import json
+import os
+import time
+from typing import ContextManager, Dict, List, Tuple
+
+# The phases every build goes through, in the order they are reported
+PHASES = [
+    "data",
+    "frontmatter",
+    "markdown",
+    "jinja2",
+    "minify",
+    "permalink",
+    "write",
+    "copy",
+    "build",
+]
+
+# Phases whose names are page source paths
+PAGE_PHASES = {"frontmatter", "markdown", "jinja2", "minify", "permalink", "write"}
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# (phase, name, start, duration, pid)
+Event = Tuple[str, str, float, float, int]
+
+
+class _Measurement:
+    def __init__(self, profiler: "Profiler", phase: str, name: str) -> None:
+        self.profiler = profiler
+        self.phase = phase
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_) -> None:
+        self.profiler.record(
+            self.phase, self.name, self.start, time.perf_counter() - self.start
+        )
+
+
+class Profiler:
+    """Collects timings for the phases of a build
+
+    Disabled by default, in which case measure costs next to nothing.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events: List[Event] = []
+
+    def start(self) -> None:
+        self.enabled = True
+        self.events = []
+
+    def stop(self) -> None:
+        self.enabled = False
+
+    def measure(self, phase: str, name: str = "") -> ContextManager[None]:
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Measurement(self, phase, name)
+
+    def record(self, phase: str, name: str, start: float, duration: float) -> None:
+        if self.enabled:
+            self.events.append((phase, name, start, duration, os.getpid()))
+
+    def get_phase_totals(self) -> Dict[str, Tuple[float, int]]:
+        totals: Dict[str, List] = defaultdict(lambda: [0.0, 0])
+        for phase, _, _, duration, _ in self.events:
+            totals[phase][0] += duration
+            totals[phase][1] += 1
+        return {phase: (total, count) for phase, (total, count) in totals.items()}
+
+    def get_slowest(self, phases: set, top: int) -> List[Tuple[str, float]]:
+        totals: Dict[str, float] = defaultdict(float)
+        for phase, name, _, duration, _ in self.events:
+            if phase in phases and name:
+                totals[name] += duration
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    def report(self, top: int = 10) -> None:
+        totals = self.get_phase_totals()
+        print("Build profile:")
+        for phase in [*PHASES, *sorted(totals.keys() - set(PHASES))]:
+            if phase in totals:
+                total, count = totals[phase]
+                print(f"  {phase:<12} {total:9.3f}s  ({count} calls)")
+
+        for title, phases in [("pages", PAGE_PHASES), ("data files", {"data"})]:
+            slowest = self.get_slowest(phases, top)
+            if slowest:
+                print(f"Slowest {title}:")
+                for name, total in slowest:
+                    print(f"  {total:9.3f}s  {name}")
+
+    def to_json(self, top: int = 10) -> Dict:
+        return {
+            "phases": {
+                phase: {"total": total, "count": count}
+                for phase, (total, count) in self.get_phase_totals().items()
+            },
+            "pages": [
+                {"path": name, "total": total}
+                for name, total in self.get_slowest(PAGE_PHASES, top)
+            ],
+            "data_files": [
+                {"path": name, "total": total}
+                for name, total in self.get_slowest({"data"}, top)
+            ],
+        }
+
+    def to_chrome_trace(self) -> Dict:
+        """Events in the Chrome trace event format, for chrome://tracing or
+        Perfetto"""
+        return {
+            "traceEvents": [
+                {
+                    "name": name or phase,
+                    "cat": phase,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": pid,
+                }
+                for phase, name, start, duration, pid in self.events
+            ]
+        }
+
+    def write(self, path: str, format: str = "json", top: int = 10) -> None:
+        output = self.to_chrome_trace() if format == "chrome" else self.to_json(top)
+        with open(path, "w+") as outfile:
+            json.dump(output, outfile, indent=2)
+
+
+profiler = Profiler()
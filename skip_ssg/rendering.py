@@ -0,0 +1,308 @@
+import math
+import multiprocessing
+import os
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import jinja2
+
+from skip_ssg.cache import BuildCache, hash_strings
+from skip_ssg.dependencies import (
+    DependencyGraph,
+    PageDependencies,
+    TemplateDependencies,
+)
+from skip_ssg.minify import Minifier
+from skip_ssg.permalinks import PermalinkIndex
+from skip_ssg.profiler import Event, profiler
+from skip_ssg.sources import PageFile, SitePage
+
+
+def create_jinja_env(cache: Optional[BuildCache] = None) -> jinja2.Environment:
+    bytecode_cache = None
+    if cache is not None:
+        bytecode_dir = cache.directory / "jinja2"
+        os.makedirs(bytecode_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_dir))
+
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"), bytecode_cache=bytecode_cache
+    )
+    env.policies["json.dumps_kwargs"] = {"sort_keys": True, "default": json_default}
+    return env
+
+
+def json_default(value: Any) -> Any:
+    """Lets tojson serialise page data, which is a ChainMap rather than a dict"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class RenderedPage:
+    def __init__(
+        self,
+        path: Path,
+        source: Path,
+        html: Optional[str],
+        dependencies: PageDependencies,
+    ) -> None:
+        self.path = path
+        self.source = source
+        # None when the page was unaffected by an incremental rebuild
+        self.html = html
+        self.dependencies = dependencies
+
+
+class PageRenderer:
+    def __init__(
+        self,
+        collections: Dict[str, List[PageFile]],
+        previous_graph: Optional[DependencyGraph] = None,
+        changed_paths: Optional[Set[Path]] = None,
+        changed_collections: Optional[Set[str]] = None,
+        cache: Optional[BuildCache] = None,
+        index: Optional[PermalinkIndex] = None,
+        jinja_globals: Optional[Dict[str, Any]] = None,
+        minifier: Optional[Minifier] = None,
+    ) -> None:
+        self.collections = collections
+        self.index = index
+        # Extra globals for every template, like asset(). They need a
+        # get_cache_key for pages using them to be cached
+        self.jinja_globals = jinja_globals or {}
+        # Applied after the page cache, which keeps the unminified HTML
+        self.minifier = minifier
+        self.previous_graph = previous_graph
+        self.changed_paths = changed_paths or set()
+        self.changed_collections = changed_collections or set()
+        self.cache = cache
+        self.reset()
+
+    def reset(self) -> None:
+        self.jinja_env = create_jinja_env(self.cache)
+        self.jinja_env.globals.update(self.jinja_globals)
+        self.template_dependencies = TemplateDependencies(self.jinja_env)
+
+    def is_unaffected(self, path: Path, dependencies: PageDependencies) -> bool:
+        if self.previous_graph is None:
+            return False
+
+        previous = self.previous_graph.outputs.get(path)
+        return previous is not None and not (
+            previous.is_affected(self.changed_paths, self.changed_collections)
+            or dependencies.is_affected(self.changed_paths, self.changed_collections)
+        )
+
+    def get_cache_key(
+        self, page: SitePage, dependencies: PageDependencies
+    ) -> Optional[str]:
+        """Hash everything a page's HTML depends on except the collections and dates
+        it uses, which are only known after it has been rendered once"""
+        if self.cache is None or dependencies.templates is None:
+            return None
+
+        try:
+            parts = page.source.get_cache_key(self.cache)
+        except TypeError:
+            return None
+
+        # Anything else handed to the templates, like pagination items
+        extra_data = self.cache.fingerprint(
+            {
+                key: value
+                for key, value in page.template_data.items()
+                if key not in {"data", "collections"}
+            }
+        )
+        if extra_data is None:
+            return None
+        parts.append(extra_data)
+
+        if self.jinja_globals:
+            jinja_globals = self.cache.fingerprint(self.jinja_globals, memoise=True)
+            if jinja_globals is None:
+                return None
+            parts.append(jinja_globals)
+
+        for template in sorted(dependencies.templates):
+            parts += [str(template), self.cache.hash_file(template) or ""]
+        return hash_strings(parts)
+
+    def get_collections_key(
+        self,
+        names: Iterable[str],
+        all_collections: bool,
+        dates_of: Optional[PageFile] = None,
+    ) -> Optional[str]:
+        """Hash the collections a page used. With dates_of, the page read dates, so
+        the mtimes of it and the pages in those collections are hashed too"""
+        if all_collections:
+            names = self.collections.keys()
+
+        parts = []
+        for name in sorted(names):
+            fingerprint = "missing"
+            if name in self.collections:
+                fingerprint = self.cache.fingerprint(
+                    self.collections[name], memoise=True
+                )
+                if fingerprint is None:
+                    return None
+                if dates_of is not None:
+                    parts += [str(page.timestamp) for page in self.collections[name]]
+            parts += [name, fingerprint]
+        if dates_of is not None:
+            parts.append(str(dates_of.timestamp))
+        return hash_strings(parts)
+
+    def get_cached_html(
+        self, cache_key: str, page_file: PageFile, dependencies: PageDependencies
+    ) -> Optional[str]:
+        manifest = self.cache.get("pages", cache_key)
+        if manifest is None:
+            return None
+
+        collections, all_collections, dates = manifest
+        collections_key = self.get_collections_key(
+            collections, all_collections, page_file if dates else None
+        )
+        if collections_key is None:
+            return None
+
+        html = self.cache.get("html", hash_strings([cache_key, collections_key]))
+        if html is not None:
+            dependencies.collections |= collections
+            dependencies.all_collections |= all_collections
+            dependencies.dates |= dates
+        return html
+
+    def set_cached_html(
+        self,
+        cache_key: str,
+        page_file: PageFile,
+        dependencies: PageDependencies,
+        html: str,
+    ) -> None:
+        collections_key = self.get_collections_key(
+            dependencies.collections,
+            dependencies.all_collections,
+            page_file if dependencies.dates else None,
+        )
+        if collections_key is None:
+            return
+
+        self.cache.set(
+            "pages",
+            cache_key,
+            (
+                dependencies.collections,
+                dependencies.all_collections,
+                dependencies.dates,
+            ),
+        )
+        self.cache.set("html", hash_strings([cache_key, collections_key]), html)
+
+    def render(self, page_file: PageFile) -> Iterator[RenderedPage]:
+        with page_file.loaded():
+            yield from self.render_pages(page_file)
+
+    def render_pages(self, page_file: PageFile) -> Iterator[RenderedPage]:
+        pages: Optional[Iterable[SitePage]] = None
+        pages_by_url = None
+        if self.index is not None:
+            pages = self.index.get_pages(page_file)
+            pages_by_url = self.index.pages_by_url
+        if pages is None:
+            pages = page_file.get_pages(self.collections)
+
+        for page in pages:
+            path = page.get_path()
+            dependencies = page.get_dependencies(self.template_dependencies)
+            if self.is_unaffected(path, dependencies):
+                previous = self.previous_graph.outputs[path]
+                yield RenderedPage(path, page_file.path, None, previous)
+                continue
+
+            cache_key = self.get_cache_key(page, dependencies)
+            if cache_key is not None:
+                html = self.get_cached_html(cache_key, page_file, dependencies)
+                if html is not None:
+                    html = self.minify(path, page_file.path, html)
+                    yield RenderedPage(path, page_file.path, html, dependencies)
+                    continue
+
+            html = page.render(self.jinja_env, pages_by_url)
+            dependencies = page.get_dependencies(self.template_dependencies)
+            if cache_key is not None:
+                self.set_cached_html(cache_key, page_file, dependencies, html)
+            html = self.minify(path, page_file.path, html)
+            yield RenderedPage(path, page_file.path, html, dependencies)
+
+    def minify(self, path: Path, source: Path, html: str) -> str:
+        if self.minifier is None or not self.minifier.applies_to(path):
+            return html
+        return self.minifier(html, str(source))
+
+
+# State inherited by forked workers, so page files and collections never have to be
+# pickled. Only set while render_page_files has a pool running.
+_renderer: Optional[PageRenderer] = None
+_page_files: List[PageFile] = []
+
+
+def _init_worker() -> None:
+    # Give every worker its own jinja2 Environment
+    _renderer.reset()
+
+
+def _render_shard(shard: range) -> Tuple[List[RenderedPage], List[Event]]:
+    # Timings are sent back with the pages so the parent can report them
+    profiler.events = []
+    rendered = []
+    for index in shard:
+        rendered += _renderer.render(_page_files[index])
+    return rendered, profiler.events
+
+
+def render_page_files(
+    page_files: List[PageFile], renderer: PageRenderer, jobs: int = 1
+) -> Iterator[RenderedPage]:
+    """Render page files, yielding pages in the same order regardless of jobs"""
+    global _renderer, _page_files
+
+    if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Parallel rendering is not supported on this platform, using 1 job")
+        jobs = 1
+
+    if jobs <= 1 or len(page_files) < 2:
+        for page_file in page_files:
+            yield from renderer.render(page_file)
+        return
+
+    # A few shards per worker keeps them busy when page costs are uneven
+    shard_size = math.ceil(len(page_files) / (jobs * 4))
+    shards = [
+        range(start, min(start + shard_size, len(page_files)))
+        for start in range(0, len(page_files), shard_size)
+    ]
+
+    _renderer, _page_files = renderer, page_files
+    try:
+        context = multiprocessing.get_context("fork")
+        with context.Pool(jobs, initializer=_init_worker) as pool:
+            for rendered, events in pool.imap(_render_shard, shards):
+                profiler.events += events
+                yield from rendered
+    finally:
+        _renderer, _page_files = None, []
@@ -1,27 +1,307 @@
+from collections import OrderedDict
+import email.utils
 import errno
 import http.server
 import functools
-import socketserver
+import io
+import json
+import os
+from pathlib import Path
+import queue
 import threading
-from typing import Callable, Dict
+from typing import BinaryIO, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from skip_ssg.dependencies import DependencyGraph
+
+# Files bigger than this are always read from disk
+MAX_CACHED_FILE_SIZE = 1024 * 1024
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# Precompressed sidecars to look for, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+class FileCache:
+    """The contents of recently served files, shared by every request thread
+
+    Entries are checked against the file's mtime and size on every hit, and build_site
+    drops the files it rewrites, so a rebuild is picked up straight away.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.entries: "OrderedDict[str, Tuple[Tuple[int, int], bytes]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result) -> bytes:
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                return entry[1]
+
+        with open(path, "rb") as infile:
+            content = infile.read()
+
+        with self.lock:
+            self._remove(path)
+            self.entries[path] = (key, content)
+            self.size += len(content)
+            while self.size > self.max_size:
+                self._remove(next(iter(self.entries)))
+        return content
+
+    def _remove(self, path: str) -> None:
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def invalidate(self, paths: Iterable[Path]) -> None:
+        with self.lock:
+            for path in paths:
+                self._remove(os.path.abspath(path))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+file_cache = FileCache()
+
+LIVE_RELOAD_PATH = "/_skip/livereload"
+# Sent on idle event streams so dropped connections get noticed
+LIVE_RELOAD_HEARTBEAT = 15
+
+LIVE_RELOAD_SNIPPET = b"""<script>
+(function () {
+  var source = new EventSource("%s");
+  source.onmessage = function (event) {
+    var message = JSON.parse(event.data);
+    var url = location.pathname.replace(/index\\.html$/, "");
+    if (message.all || message.urls.indexOf(url) !== -1) {
+      location.reload();
+    }
+  };
+})();
+</script>
+""" % LIVE_RELOAD_PATH.encode()
+
+
+def output_to_url(path: Path) -> str:
+    url = "/" + path.as_posix()
+    if url.endswith("index.html"):
+        url = url[: -len("index.html")]
+    return url
+
+
+class LiveReload:
+    """Pushes the URLs a rebuild changed to every open event stream"""
+
+    def __init__(self) -> None:
+        self.clients: Set[queue.Queue] = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        client: queue.Queue = queue.Queue()
+        with self.lock:
+            self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client: queue.Queue) -> None:
+        with self.lock:
+            self.clients.discard(client)
+
+    def notify(self, urls: Iterable[str], reload_all: bool = False) -> None:
+        urls = sorted(urls)
+        if not urls and not reload_all:
+            return
+        message = json.dumps({"urls": urls, "all": reload_all})
+        with self.lock:
+            for client in self.clients:
+                client.put(message)
+
+    def notify_build(self, graph: DependencyGraph) -> None:
+        # Copied files could be stylesheets or scripts used anywhere
+        self.notify((output_to_url(path) for path in graph.written), bool(graph.copied))
+
+    def close(self) -> None:
+        """End every open event stream"""
+        with self.lock:
+            for client in self.clients:
+                client.put(None)
+
+
+live_reload = LiveReload()
 
 
 class QuietHander(http.server.SimpleHTTPRequestHandler):
+    # Keep connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, live_reload: bool = False, **kwargs) -> None:
+        # Set before handling the request, which happens in super().__init__
+        self.live_reload = live_reload
+        super().__init__(*args, **kwargs)
+
     def log_message(self, format, *args):
         # Silence all logs
         return
 
+    def do_GET(self):
+        if self.live_reload and self.path == LIVE_RELOAD_PATH:
+            self.stream_events()
+        else:
+            super().do_GET()
+
+    def stream_events(self) -> None:
+        # Subscribe first so nothing is missed once the client sees the response
+        client = live_reload.subscribe()
+        try:
+            self.send_response(http.HTTPStatus.OK)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # The stream has no length, so the connection can't be reused afterwards
+            self.close_connection = True
+
+            while True:
+                try:
+                    message = client.get(timeout=LIVE_RELOAD_HEARTBEAT)
+                except queue.Empty:
+                    self.wfile.write(b": heartbeat\n\n")
+                else:
+                    if message is None:
+                        return
+                    self.wfile.write(f"data: {message}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            live_reload.unsubscribe(client)
+
+    def send_head(self) -> Optional[BinaryIO]:
+        path = os.path.abspath(self.translate_path(self.path))
+        if os.path.isdir(path):
+            if not self.path.split("?", 1)[0].endswith("/"):
+                # Let SimpleHTTPRequestHandler redirect to the trailing slash
+                return super().send_head()
+            path = os.path.join(path, "index.html")
+            if not os.path.isfile(path):
+                return super().send_head()
+        if not os.path.isfile(path):
+            return super().send_head()
+
+        content_type = self.guess_type(path)
+        inject = self.live_reload and content_type == "text/html"
+        if inject:
+            # The snippet has to go into the uncompressed page
+            encoding = None
+        else:
+            encoding, path = self.get_encoded_path(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        variant = (encoding or "") + ("-live" if inject else "")
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{variant}"'
+        last_modified = self.date_time_string(int(stat.st_mtime))
+        if self.is_not_modified(etag, stat.st_mtime):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            return None
+
+        if inject or stat.st_size <= MAX_CACHED_FILE_SIZE:
+            content = file_cache.get(path, stat)
+            if inject:
+                content = inject_snippet(content)
+            body: BinaryIO = io.BytesIO(content)
+            length = len(content)
+        else:
+            body = open(path, "rb")
+            length = stat.st_size
+
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        return body
+
+    def get_encoded_path(self, path: str) -> Tuple[Optional[str], str]:
+        """Use a precompressed copy of path if the client accepts its encoding and
+        it isn't older than path, like one left behind by an earlier build"""
+        accepted = {
+            value.split(";", 1)[0].strip()
+            for value in self.headers.get("Accept-Encoding", "").split(",")
+        }
+        mtime_ns = None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                sidecar = os.stat(path + suffix)
+            except OSError:
+                continue
+            if mtime_ns is None:
+                mtime_ns = os.stat(path).st_mtime_ns
+            if sidecar.st_mtime_ns >= mtime_ns:
+                return encoding, path + suffix
+        return None, path
+
+    def is_not_modified(self, etag: str, mtime: float) -> bool:
+        if "If-None-Match" in self.headers:
+            tags = [tag.strip() for tag in self.headers["If-None-Match"].split(",")]
+            return etag in tags or "*" in tags
+
+        if "If-Modified-Since" in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(
+                    self.headers["If-Modified-Since"]
+                )
+            except (TypeError, ValueError, IndexError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
+
+
+def inject_snippet(html: bytes) -> bytes:
+    end = html.rfind(b"</body>")
+    if end == -1:
+        return html + LIVE_RELOAD_SNIPPET
+    return html[:end] + LIVE_RELOAD_SNIPPET + html[end:]
+
+
+class SkipServer(http.server.ThreadingHTTPServer):
+    # Don't let open keep-alive connections stop the process from exiting
+    daemon_threads = True
+
 
 def _start_server_on_port(
     handler: Callable[..., http.server.SimpleHTTPRequestHandler], port: int
 ):
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    with SkipServer(("", port), handler) as httpd:
         print(f"Serving at localhost:{port}")
         httpd.serve_forever()
 
 
 def run_server(config: Dict):
-    Handler = functools.partial(QuietHander, directory=config["output"])
+    Handler = functools.partial(
+        QuietHander,
+        directory=config["output"],
+        live_reload=config.get("live_reload", False),
+    )
 
     if config.get("port") is None:
         current_port = 8080
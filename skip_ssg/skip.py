@@ -1,19 +1,37 @@
 import argparse
-from collections import defaultdict
-import errno
+from collections import ChainMap
 import os
 from pathlib import Path
-import shutil
-from typing import Any, Callable, Dict, List, Mapping, Set
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
 
 from gitignore_parser import parse_gitignore
-import jinja2
-import watchgod
 
+from skip_ssg.assets import (
+    AssetManifest,
+    AssetSync,
+    DEFAULT_MANIFEST,
+    get_copy_targets,
+)
+from skip_ssg.cache import BuildCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+from skip_ssg.collection import Collections
+from skip_ssg.compression import (
+    Compressor,
+    DEFAULT_MIN_SIZE,
+    get_sidecars,
+    remove_sidecars,
+)
+from skip_ssg.data import DataLoader, data_cache
+from skip_ssg.dependencies import DependencyGraph
+from skip_ssg.minify import Minifier, minify_html
+from skip_ssg.permalinks import PermalinkCollisionException, get_permalink_index
+from skip_ssg.profiler import profiler
+from skip_ssg.rendering import PageRenderer, render_page_files
 import skip_ssg.server as server
 from skip_ssg.sources import (
     DataFile,
     DataFileFactory,
+    MarkdownFile,
     PageFile,
     PageFileFactory,
 )
@@ -21,118 +39,217 @@ import skip_ssg.watchers as watchers
 
 try:
     import settings
+
+    USE_SETTINGS = True
 except ImportError:
     print("No settings file found, using defaults")
     USE_SETTINGS = False
 
 
+def is_unchanged(path: Path, content: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != len(content):
+            return False
+        with open(path, "rb") as infile:
+            return infile.read() == content
+    except OSError:
+        return False
+
+
 def write_page(
-    site_dir: Path, permalink: Path, filepath: Path, html: str, quiet: bool = False
-) -> None:
+    site_dir: Path,
+    permalink: Path,
+    filepath: Path,
+    html: str,
+    quiet: bool = False,
+    created_dirs: Optional[Set[Path]] = None,
+) -> bool:
+    """Write a page unless the existing output is identical, returning whether it
+    was written
+
+    Leaving unchanged outputs alone keeps their mtimes, so deploys that sync by
+    mtime or checksum only pick up pages that really changed. Pass the same
+    created_dirs set for a whole build to skip repeated os.makedirs calls.
+    """
     full_path = site_dir / permalink
+    content = html.encode("utf-8")
+    if is_unchanged(full_path, content):
+        return False
+
     if not quiet:
         print("Writing", full_path, "from", filepath)
-    os.makedirs(full_path.parent, exist_ok=True)
-    with open(full_path, "w+") as outfile:
-        outfile.write(html)
+    if created_dirs is None or full_path.parent not in created_dirs:
+        os.makedirs(full_path.parent, exist_ok=True)
+        if created_dirs is not None:
+            created_dirs.add(full_path.parent)
+    with open(full_path, "wb") as outfile:
+        outfile.write(content)
+    return True
 
 
 def get_data_from_datafiles(data_files: List[DataFile], fail_on_error) -> Dict:
-    data = {}
-    for data_file in data_files:
-        try:
-            file_data = data_file.get_data()
-        except Exception as e:
-            if not fail_on_error:
-                print(f'Failed to load data from {data_file.path}: "{e}", skipping...')
-                continue
-            else:
-                raise e
-
-        if not isinstance(file_data, Dict):
-            file_data = {data_file.path.stem: file_data}
-
-        data = {**data, **file_data}
-    return data
+    return DataLoader(fail_on_error).load(data_files)
 
 
 def get_page_files(
     ignores: Set[str],
     should_ignore: Callable[[str], bool],
     path: Path,
-    data: Dict,
+    data: Mapping,
     fail_on_error: bool,
+    data_sources: Tuple[Path, ...] = (),
+    pff: Optional[PageFileFactory] = None,
+    data_loader: Optional[DataLoader] = None,
 ) -> List[PageFile]:
     page_paths = []
     page_files: List[PageFile] = []
     data_files: List[DataFile] = []
     dirs = []
 
-    pff = PageFileFactory()
+    if pff is None:
+        pff = PageFileFactory()
+    if data_loader is None:
+        data_loader = DataLoader(fail_on_error)
     dff = DataFileFactory()
     # Go over all the files to identiy all the data and page sources
     for entry in os.scandir(path):
-        if entry.name in ignores or should_ignore(entry.path):
+        # Nested directories like an output of "build/site" are matched by path
+        if (
+            entry.name in ignores
+            or os.path.normpath(entry.path) in ignores
+            or should_ignore(entry.path)
+        ):
             continue
         if entry.is_dir():
             dirs.append(Path(entry.path))
         elif entry.is_file():
             path = Path(entry.path)
             if pff.is_valid_file(path):
-                # Don't load pages yet because we need to process all the data first
-                page_paths.append(path)
+                # Don't load pages yet because we need to process all the data first.
+                # The entry caches its stat, so keep the mtime for the page's date
+                page_paths.append((path, entry.stat().st_mtime))
             elif dff.is_valid_file(path):
                 data_files.append(dff.load_source_file(path))
 
-        data = {**data, **get_data_from_datafiles(data_files, fail_on_error)}
+    # Layer this directory's data over its parents' rather than copying it, so each
+    # data file is loaded once and subdirectories share everything above them
+    if not isinstance(data, ChainMap):
+        data = ChainMap(data)
+    directory_data = data_loader.load(data_files)
+    if directory_data:
+        data = data.new_child(directory_data)
+
+    data_sources = (*data_sources, *(data_file.path for data_file in data_files))
 
-    for page_path in page_paths:
-        page_files.append(pff.load_source_file(page_path, data))
+    for page_path, mtime in page_paths:
+        page_files.append(pff.load_source_file(page_path, data, data_sources, mtime))
 
     # Recurse
     for dir_path in dirs:
         page_files += get_page_files(
-            ignores, should_ignore, dir_path, data, fail_on_error
+            ignores,
+            should_ignore,
+            dir_path,
+            data,
+            fail_on_error,
+            data_sources,
+            pff,
+            data_loader,
         )
 
     return page_files
 
 
-def get_collections(pages: List[PageFile]) -> Mapping[str, List[PageFile]]:
-    collections = defaultdict(list)
-    for page in pages:
-        collections["all"].append(page)
-        for tag in page.tags:
-            collections[tag].append(page)
-
-    for collection in collections.values():
-        collection.sort(key=lambda item: item.date)
-
-    return collections
+def get_collections(pages: List[PageFile]) -> Collections:
+    return Collections(pages)
 
 
 def false(_: Any) -> bool:
     return False
 
 
-def build_site(config: Dict, should_ignore: Callable[[str], bool]) -> None:
-    print("Building Site")
-
-    data = {}
+# Directories that don't hold pages, though changes to them still need a rebuild
+SOURCE_DIRS = {"data", "templates"}
 
-    site_dir = Path(config["output"])
 
-    ignore_dirs = {
+def get_ignore_dirs(config: Dict) -> Set[str]:
+    """Directories that are never searched for pages"""
+    return {
         ".git",
-        "data",
-        config["output"],
-        "templates",
         "__pycache__",
         "venv",
         ".venv",
         "node_modules",
+        os.path.normpath(config["output"]),
+        os.path.normpath(config.get("cache_dir", DEFAULT_CACHE_DIR)),
+        *SOURCE_DIRS,
     }
 
+
+# Changes to these can affect every page in ways the dependency graph can't see
+FULL_REBUILD_PATHS = {Path(".skipignore"), Path("settings.py")}
+
+
+def get_changed_paths(changes: Set[Tuple[Any, str]]) -> Set[Path]:
+    return {Path(os.path.normpath(path)) for _, path in changes}
+
+
+def remove_stale_pages(
+    site_dir: Path, previous_graph: DependencyGraph, graph: DependencyGraph
+) -> None:
+    for output in previous_graph.outputs.keys() - graph.outputs.keys():
+        full_path = site_dir / output
+        print("Removing", full_path)
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        remove_sidecars(full_path)
+
+
+def build_site(
+    config: Dict,
+    should_ignore: Callable[[str], bool],
+    changes: Optional[Set[Tuple[Any, str]]] = None,
+    previous_graph: Optional[DependencyGraph] = None,
+) -> DependencyGraph:
+    """Build the site, returning the graph of what each output page depends on
+
+    When changes (as yielded by watchers.watch) and the graph from the previous build
+    are given, only pages affected by the changes are rendered and written.
+    """
+    changed_paths = get_changed_paths(changes) if changes is not None else set()
+    # Full rebuilds still remove the pages the previous build wrote and this one
+    # doesn't
+    stale_graph = previous_graph
+    if previous_graph is not None and changed_paths & FULL_REBUILD_PATHS:
+        previous_graph = None
+    incremental = changes is not None and previous_graph is not None
+
+    print("Rebuilding Site" if incremental else "Building Site")
+
+    if config.get("profile"):
+        profiler.start()
+    build_start = time.perf_counter()
+
+    data = {}
+
+    site_dir = Path(config["output"])
+
+    ignore_dirs = get_ignore_dirs(config)
+
+    MarkdownFile.configure(
+        config.get("markdown_extensions", MarkdownFile.extensions),
+        config.get("markdown_extension_configs", MarkdownFile.extension_configs),
+    )
+
+    cache = None
+    if config.get("cache", True):
+        cache = BuildCache(
+            config.get("cache_dir", DEFAULT_CACHE_DIR),
+            config.get("cache_size", DEFAULT_CACHE_SIZE),
+        )
+
     dff = DataFileFactory()
     data_files = []
     for root, dirs, files in os.walk("data"):
@@ -144,38 +261,206 @@ def build_site(config: Dict, should_ignore: Callable[[str], bool]) -> None:
             if dff.is_valid_file(path):
                 data_files.append(dff.load_source_file(path))
 
-    data = get_data_from_datafiles(data_files, config["fail_on_error"])
+    data_loader = DataLoader(
+        config["fail_on_error"],
+        config.get("data_concurrency", 8),
+        config.get("data_timeout"),
+        data_cache if config.get("data_cache", True) else None,
+        config.get("data_cache_ttl"),
+        cache if config.get("persist_data_cache", False) else None,
+    )
+    data = data_loader.load(data_files)
 
     page_files = get_page_files(
-        ignore_dirs, should_ignore, Path("."), data, config["fail_on_error"]
+        ignore_dirs,
+        should_ignore,
+        Path("."),
+        data,
+        config["fail_on_error"],
+        tuple(data_file.path for data_file in data_files),
+        PageFileFactory(cache, config.get("low_memory", False)),
+        data_loader,
     )
+    graph = DependencyGraph()
+    # Data served from the cache is the same as last time, so keep its fingerprint
+    if stale_graph is not None:
+        graph.data.update(stale_graph.data)
+    graph.data.update(data_loader.fingerprints)
+    if incremental:
+        # Python data files run every build, and their pages only need rendering
+        # again when what they returned changed
+        changed_paths |= {
+            path
+            for path, fingerprint in data_loader.fingerprints.items()
+            if fingerprint is None or fingerprint != previous_graph.data.get(path)
+        }
+
     collections = get_collections(page_files)
+    # Resolve every output path up front, so collisions fail the build before
+    # anything is written
+    index = get_permalink_index(page_files, collections)
+
+    copy_targets = list(get_copy_targets(config["copy"], site_dir))
+    # Always there, so templates using asset() also build without fingerprinting,
+    # when it links to the plain paths
+    manifest = AssetManifest(cache)
+    jinja_globals = {"asset": manifest}
+    manifest_path = None
+    fingerprint = {Path(src) for src in config.get("fingerprint", [])}
+    if fingerprint:
+        # Fingerprint before rendering so templates can link to the hashed names
+        for src, dest in copy_targets:
+            if src in fingerprint:
+                manifest.add(src, dest)
+        manifest_path = Path(config.get("asset_manifest", DEFAULT_MANIFEST))
+        write_page(
+            site_dir, manifest_path, manifest_path, manifest.to_json(), quiet=True
+        )
+        graph.assets = manifest.paths
+
+    minifier = None
+    if config.get("minify", False):
+        # Either True for the built in minifier, or a function from settings.py
+        minify = config["minify"] if callable(config["minify"]) else minify_html
+        minifier = Minifier(minify, cache)
+
+    renderer = PageRenderer(
+        collections,
+        cache=cache,
+        index=index,
+        jinja_globals=jinja_globals,
+        minifier=minifier,
+    )
+    # Pages don't record which assets they link to, so when any fingerprint changes
+    # they all have to be rendered again
+    if incremental and previous_graph.assets == graph.assets:
+        renderer = PageRenderer(
+            collections,
+            previous_graph,
+            changed_paths,
+            previous_graph.get_changed_collections(
+                changed_paths,
+                {page_file.path: page_file.tags for page_file in page_files},
+                {page_file.path: page_file.data_sources for page_file in page_files},
+            ),
+            cache,
+            index,
+            jinja_globals,
+            minifier,
+        )
 
-    jinja_env = jinja2.Environment(loader=jinja2.FileSystemLoader("templates"))
     for page_file in page_files:
-        pages = page_file.get_pages(collections)
-        for page in pages:
-            html = page.render(jinja_env)
-            write_page(site_dir, page.get_path(), page.source.path, html)
-
-    for copy_target in config["copy"]:
-        if ":" in copy_target:
-            src, dest = copy_target.split(":")
-        else:
-            src = dest = copy_target
+        graph.add_source(page_file.path, page_file.tags)
+
+    changed_targets = copy_targets
+    if incremental:
+        changed_targets = [
+            (src, dest)
+            for src, dest in copy_targets
+            if any(path == src or src in path.parents for path in changed_paths)
+        ]
+    unchanged_targets = [
+        target for target in copy_targets if target not in changed_targets
+    ]
+    asset_sync = AssetSync(
+        site_dir,
+        config.get("copy_jobs", 8),
+        config.get("copy_links", False),
+        jinja_globals.get("asset"),
+    )
+
+    compressor = None
+    if config.get("compress", False):
+        compressor = Compressor(
+            config.get("compress_jobs", 4),
+            config.get("compress_min_size", DEFAULT_MIN_SIZE),
+        )
 
-        dest = site_dir / dest
-        print(f"Copying {src} to {dest}")
+    written = unchanged = 0
+    created_dirs: Set[Path] = set()
+    for rendered in render_page_files(page_files, renderer, config.get("jobs", 1)):
+        if written + unchanged == 0:
+            # Copy while the rest of the pages render. Waiting for the first page
+            # means parallel rendering has already forked its workers, so they
+            # don't inherit the copying threads
+            asset_sync.start(changed_targets, unchanged_targets)
+        # Streamed pagination isn't in the permalink index, so catch its collisions
+        # here
+        if rendered.path in graph.outputs:
+            raise PermalinkCollisionException(
+                f"{rendered.source} and {graph.outputs[rendered.path].source} "
+                f"both output to {rendered.path}"
+            )
+        was_written = False
+        if rendered.html is not None:
+            with profiler.measure("write", str(rendered.source)):
+                was_written = write_page(
+                    site_dir,
+                    rendered.path,
+                    rendered.source,
+                    rendered.html,
+                    created_dirs=created_dirs,
+                )
+        if was_written:
+            server.file_cache.invalidate([site_dir / rendered.path])
+            if compressor is None:
+                # Sidecars from an earlier build would be stale now
+                remove_sidecars(site_dir / rendered.path)
+            graph.written.add(rendered.path)
+            written += 1
+        else:
+            unchanged += 1
+        graph.add_page(rendered.path, rendered.dependencies)
+
+        if compressor is not None and rendered.html is not None:
+            # Only pages whose content changed need compressing again
+            content = rendered.html.encode("utf-8")
+            full_path = site_dir / rendered.path
+            if was_written or compressor.is_missing(full_path, len(content)):
+                compressor.submit(full_path, content)
+
+    print(f"{written} pages written, {unchanged} unchanged")
+
+    if written + unchanged == 0:
+        asset_sync.start(changed_targets, unchanged_targets)
+    graph.copied = asset_sync.wait()
+    server.file_cache.invalidate(graph.copied)
+    if compressor is not None:
+        compressor.wait()
+        server.file_cache.invalidate(
+            sidecar
+            for output in graph.written
+            for sidecar in get_sidecars(site_dir / output)
+        )
 
-        try:
-            shutil.copytree(src, dest, dirs_exist_ok=True)
-        except OSError as e:
-            if e.errno == errno.ENOTDIR:
-                shutil.copy(src, dest)
-            else:
-                raise e
+    keep = {site_dir / output for output in graph.outputs}
+    keep |= {sidecar for output in list(keep) for sidecar in get_sidecars(output)}
+    if manifest_path is not None:
+        keep.add(site_dir / manifest_path)
+    asset_sync.remove_stale(keep)
+    if changed_targets:
+        print(f"{len(graph.copied)} files copied, {asset_sync.unchanged} unchanged")
+
+    if stale_graph is not None:
+        remove_stale_pages(site_dir, stale_graph, graph)
+
+    if cache is not None:
+        cache.prune()
+
+    if profiler.enabled:
+        profiler.record("build", "", build_start, time.perf_counter() - build_start)
+        profiler.report(config.get("profile_top", 10))
+        if isinstance(config["profile"], str):
+            profiler.write(
+                config["profile"],
+                config.get("profile_format", "json"),
+                config.get("profile_top", 10),
+            )
+            print("Wrote profile to", config["profile"])
+        profiler.stop()
 
     print("Build Complete!\n")
+    return graph
 
 
 def main():
@@ -183,10 +468,31 @@ def main():
     parser.add_argument(
         "-w", "--watch", help="Watch files and reload on changes", action="store_true"
     )
+    parser.add_argument(
+        "--watch-debounce",
+        help=(
+            "Wait until files have stopped changing for this many seconds before "
+            "rebuilding"
+        ),
+        type=float,
+    )
+    parser.add_argument(
+        "--watch-polling",
+        help="Poll for changes instead of using inotify, for network filesystems",
+        action="store_const",
+        const=True,
+    )
     parser.add_argument(
         "-s", "--serve", help="Serve the site on localhost", action="store_true"
     )
     parser.add_argument("-p", "--port", help="The port to serve on", type=int)
+    parser.add_argument(
+        "--no-live-reload",
+        help="Don't reload pages in the browser when --serve --watch rebuilds them",
+        action="store_const",
+        const=False,
+        dest="live_reload",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -211,6 +517,107 @@ def main():
         ),
         action="store_true",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of processes to render pages with",
+        type=int,
+    )
+    parser.add_argument(
+        "--minify",
+        help="Minify the HTML of every page, along with its inline CSS and JS",
+        action="store_const",
+        const=True,
+    )
+    parser.add_argument(
+        "--compress",
+        help=(
+            "Write gzip sidecars, and brotli ones if the brotli module is installed, "
+            "next to every page"
+        ),
+        action="store_const",
+        const=True,
+    )
+    parser.add_argument(
+        "--compress-min-size",
+        help="Pages smaller than this many bytes are left uncompressed",
+        type=int,
+    )
+    parser.add_argument(
+        "--fingerprint",
+        help=(
+            "Copy targets whose files get their content hash added to their name. "
+            "Templates link to them with asset(), for example "
+            "asset('static/style.css')"
+        ),
+        nargs="+",
+    )
+    parser.add_argument(
+        "--copy-jobs",
+        help="The number of files that can be copied at the same time",
+        type=int,
+    )
+    parser.add_argument(
+        "--copy-links",
+        help="Hard link copied files into the site instead of copying them",
+        action="store_const",
+        const=True,
+    )
+    parser.add_argument(
+        "--data-concurrency",
+        help="The number of data files that can load at the same time",
+        type=int,
+    )
+    parser.add_argument(
+        "--data-timeout",
+        help="Fail data files that take longer than this many seconds to load",
+        type=float,
+    )
+    parser.add_argument(
+        "--data-cache-ttl",
+        help=(
+            "Reuse data from Python data files for this many seconds, unless they "
+            "set CACHE_TTL themselves"
+        ),
+        type=float,
+    )
+    parser.add_argument(
+        "--low-memory",
+        help=(
+            "Only keep page metadata in memory and read page bodies from disk as "
+            "they are rendered"
+        ),
+        action="store_const",
+        const=True,
+        dest="low_memory",
+    )
+    parser.add_argument(
+        "--profile",
+        help=(
+            "Report how long each phase of the build took, and optionally write "
+            "the timings to a file"
+        ),
+        nargs="?",
+        const=True,
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--profile-format",
+        help="The format to write the profile in",
+        choices=["json", "chrome"],
+    )
+    parser.add_argument(
+        "--profile-top",
+        help="The number of slowest pages and data files to report",
+        type=int,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="Don't read from or write to the build cache",
+        action="store_const",
+        const=False,
+        dest="cache",
+    )
     args = parser.parse_args()
 
     skipignore_path = Path(".skipignore")
@@ -222,19 +629,45 @@ def main():
         should_ignore = false
 
     # Default config
-    config = {"output": "_site", "copy": []}
+    config = {"output": "_site", "copy": [], "jobs": 1}
 
     if USE_SETTINGS:
         config = {**config, **vars(settings).get("OPTIONS", {})}
 
     # CLI flags take precedence over settings file
     dict_args = vars(args)
-    arg_config_options = ["output", "port", "copy", "fail_on_error"]
+    arg_config_options = [
+        "output",
+        "port",
+        "copy",
+        "fail_on_error",
+        "jobs",
+        "cache",
+        "minify",
+        "compress",
+        "compress_min_size",
+        "fingerprint",
+        "copy_jobs",
+        "copy_links",
+        "low_memory",
+        "data_concurrency",
+        "data_timeout",
+        "data_cache_ttl",
+        "profile",
+        "profile_format",
+        "profile_top",
+        "live_reload",
+        "watch_debounce",
+        "watch_polling",
+    ]
     for option in arg_config_options:
         if dict_args[option] is not None:
             config[option] = dict_args[option]
 
-    build_site(config, should_ignore)
+    # Pages can only be told to reload when there's a server for them to listen to
+    config["live_reload"] = args.serve and config.get("live_reload", True)
+
+    graph = build_site(config, should_ignore)
 
     if args.serve:
         server.run(config)
@@ -242,16 +675,19 @@ def main():
     if args.watch or args.serve:
         print("\nWatching files for changes...")
 
-        if should_ignore is not false:
-            for changes in watchgod.watch(
-                ".",
-                watcher_cls=watchers.SkipIgnoreWatcher,
-                watcher_kwargs={"should_ignore": should_ignore},
-            ):
-                build_site(config, should_ignore)
-        else:
-            for changes in watchgod.watch(".", watcher_cls=watchers.SkipDefaultWatcher):
-                build_site(config, should_ignore)
+        watch = watchers.watch(
+            ".",
+            # Data files and templates aren't pages, but they're still watched
+            get_ignore_dirs(config) - SOURCE_DIRS,
+            should_ignore if should_ignore is not false else None,
+            config.get("watch_debounce", watchers.DEFAULT_DEBOUNCE),
+            polling=config.get("watch_polling", False),
+        )
+        for changes in watch:
+            # changes is None when some were missed, so everything is rebuilt
+            graph = build_site(config, should_ignore, changes, graph)
+            if config["live_reload"]:
+                server.live_reload.notify_build(graph)
 
 
 if __name__ == "__main__":
@@ -1,25 +1,126 @@
 from abc import ABC, abstractmethod
-import importlib
+import asyncio
+from collections import ChainMap
+from concurrent.futures import Executor
+from contextlib import contextmanager
+import datetime
+import functools
+import importlib.util
+import inspect
+import itertools
 import json
 import os
 from pathlib import Path
 import sys
-from typing import Any, Dict, Generator, List, Union
+import threading
+from types import ModuleType
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import arrow
 import frontmatter
 import jinja2
 import markdown
 
+from skip_ssg.cache import BuildCache, hash_strings
+from skip_ssg.dependencies import (
+    PageDependencies,
+    TemplateDependencies,
+    TrackedCollections,
+    TrackedPages,
+    date_reads,
+)
+from skip_ssg.profiler import profiler
 
-def chunks(lst: List, n: int) -> Generator[List, None, None]:
-    """Yield successive n-sized chunks from lst
 
+def chunks(items: Iterable, n: int) -> Generator[List, None, None]:
+    """Yield successive n-sized chunks from items
+
+    Sequences are sliced, anything else is only iterated once, so generators can be
+    paginated without building a list of everything first.
     Thank you SO: https://stackoverflow.com/questions/312443/how-do-you-split-a-list-into-evenly-sized-chunks
     """
+    if isinstance(items, Sequence):
+        for i in range(0, len(items), n):
+            yield items[i : i + n]
+        return
 
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_timestamp(value: Any) -> float:
+    """Seconds since the epoch for anything arrow.get accepts, reading naive dates as
+    UTC like arrow does, but without building an Arrow object for the common cases"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return arrow.get(value).timestamp()
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(
+            value.year, value.month, value.day, tzinfo=datetime.timezone.utc
+        ).timestamp()
+    return arrow.get(value).timestamp()
+
+
+def read_content(path: Path) -> str:
+    """Read the body of a page file without parsing its frontmatter again"""
+    with open(path) as infile:
+        text = infile.read().strip()
+
+    # Same steps as frontmatter.parse, minus loading the metadata
+    handler = frontmatter.detect_format(text, frontmatter.handlers)
+    if handler is None:
+        return text
+    try:
+        _, content = handler.split(text)
+    except ValueError:
+        return text
+    return content.strip()
+
+
+# Shared by every permalink in the build, since they don't need a loader
+permalink_env = jinja2.Environment()
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_permalink(permalink: str) -> jinja2.Template:
+    """Compile a permalink template once, however many pages share it"""
+    return permalink_env.from_string(permalink)
+
+
+def permalink_to_path(permalink: str) -> Path:
+    # Permalinks are relative to the site root, even with a leading slash
+    permalink = permalink.lstrip("/")
+    if permalink == "" or permalink.endswith("/"):
+        # Filename is not specified, so append 'index.html'
+        return Path(permalink) / "index.html"
+    else:
+        # Assume the last part of the path is the filename
+        return Path(permalink)
 
 
 class SitePage:
@@ -30,33 +131,81 @@ class SitePage:
         self.data = data
         self.collections = collections
         self.template_data = {"data": self.data, "collections": self.collections}
+        self.used_collections: Optional[TrackedCollections] = None
+        self.used_dates = False
+        self.path: Optional[Path] = None
 
-    def render(self, jinja2_env: jinja2.Environment) -> str:
-        html = self.source.get_html(jinja2_env, page=self, **self.template_data)
-        if "layout" in self.data:
-            template = jinja2_env.get_template(self.data["layout"])
-            return template.render(
-                content=html,
-                page=self,
-                data=self.data,
-                collections=self.collections,
+    def render(
+        self,
+        jinja2_env: jinja2.Environment,
+        pages_by_url: Optional[Mapping[str, "SitePage"]] = None,
+    ) -> str:
+        # Record which collections the templates look at so watch mode knows when
+        # this page needs rebuilding
+        self.used_collections = TrackedCollections(self.collections)
+        template_data = {**self.template_data, "collections": self.used_collections}
+        if pages_by_url is not None:
+            template_data["pages_by_url"] = TrackedPages(
+                pages_by_url, self.used_collections
             )
-        else:
-            return html
 
-    def get_path(self) -> Path:
-        if "permalink" in self.data:
+        # and whether they read dates, which the page cache only keys pages on then
+        date_reads.reset()
+        html = self.source.get_html(jinja2_env, page=self, **template_data)
+        if "layout" in self.data:
+            with profiler.measure("jinja2", str(self.source.path)):
+                template = jinja2_env.get_template(self.data["layout"])
+                html = template.render(
+                    content=html,
+                    page=self,
+                    **{
+                        key: value
+                        for key, value in template_data.items()
+                        if key not in {"items", "index"}
+                    },
+                )
+        self.used_dates = date_reads.read
+        return html
+
+    def get_dependencies(
+        self, template_dependencies: TemplateDependencies
+    ) -> PageDependencies:
+        templates = self.source.get_referenced_templates(template_dependencies)
+        if templates is not None and "layout" in self.data:
+            layout = template_dependencies.of_template(self.data["layout"])
+            templates = None if layout is None else templates | layout
+
+        collections: Set[str] = set()
+        all_collections = False
+        if self.used_collections is not None:
+            collections |= self.used_collections.accessed
+            all_collections = self.used_collections.accessed_all
 
-            jinja2_env = jinja2.Environment()
+        if "pagination" in self.data:
+            pagination_source = self.data["pagination"]["data"]
+            if pagination_source not in self.data:
+                collections.add(pagination_source)
+
+        return PageDependencies(
+            self.source.path,
+            self.source.data_sources,
+            templates,
+            collections,
+            all_collections,
+            self.used_dates,
+        )
 
-            permalink_template = jinja2_env.from_string(self.data["permalink"])
-            permalink = permalink_template.render(data=self.data)
-            if permalink.endswith("/"):
-                # Filename is not specified, so append 'index.html'
-                return Path(permalink) / "index.html"
-            else:
-                # Assume the last part of the path is the filename
-                return Path(permalink)
+    def get_path(self) -> Path:
+        # Templates ask for permalinks of the same pages over and over, so only
+        # resolve them once
+        if self.path is None:
+            self.path = self.resolve_path()
+        return self.path
+
+    def resolve_path(self) -> Path:
+        if "permalink" in self.data:
+            permalink = compile_permalink(self.data["permalink"]).render(data=self.data)
+            return permalink_to_path(permalink)
         else:
             path = self.source.path
             if len(path.parts) == 1 and path.stem == "index":
@@ -89,28 +238,19 @@ class PaginationSitePage(SitePage):
         super().__init__(source, data, collections)
         self.index = index
         self.items = items
-        self.template_data = {
-            **self.template_data,
-            "items": self.items,
-            "index": self.index,
-        }
+        # template_data is already this page's own dict, so no need to copy it
+        self.template_data["items"] = self.items
+        self.template_data["index"] = self.index
 
-    def get_path(self) -> Path:
+    def resolve_path(self) -> Path:
         if self.index == 0:
-            return super().get_path()
+            return super().resolve_path()
         else:
             if "permalink" in self.data:
-                jinja2_env = jinja2.Environment()
-                permalink_template = jinja2_env.from_string(self.data["permalink"])
-                permalink = permalink_template.render(
+                permalink = compile_permalink(self.data["permalink"]).render(
                     data=self.data, index=self.index, items=self.items
                 )
-                if permalink.endswith("/"):
-                    # Filename is not specified, so append 'index.html'
-                    return Path(permalink) / "index.html"
-                else:
-                    # Assume the last part of the path is the filename
-                    return Path(permalink)
+                return permalink_to_path(permalink)
             else:
                 path = self.source.path
                 return path.parent / path.stem / str(self.index) / "index.html"
@@ -131,11 +271,35 @@ class MissingPaginationSourceException(Exception):
 class SourceFile(ABC):
     suffixes: set
 
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, mtime: Optional[float] = None) -> None:
         if path.suffix not in self.suffixes:
             raise InvalidFileExtensionException(path.suffix)
         self.path = path
-        self.date = arrow.get(os.path.getmtime(self.path))
+        # Dates are kept as timestamps, which are cheap to store and sort, and only
+        # turned into Arrow objects when something asks for them
+        self._timestamp = mtime
+        self._date_value: Any = None
+        self._date: Optional[arrow.Arrow] = None
+
+    @property
+    def timestamp(self) -> float:
+        if self._timestamp is None:
+            self._timestamp = os.path.getmtime(self.path)
+        return self._timestamp
+
+    @property
+    def date(self) -> arrow.Arrow:
+        date_reads.read = True
+        if self._date is None:
+            value = self._date_value
+            self._date = arrow.get(self.timestamp if value is None else value)
+        return self._date
+
+    @date.setter
+    def date(self, value: Any) -> None:
+        self._date_value = value
+        self._date = None
+        self._timestamp = to_timestamp(value)
 
     def __str__(self):
         return str(self.path)
@@ -146,13 +310,43 @@ class NoPermalinkException(Exception):
 
 
 class PageFile(SourceFile):
-    def __init__(self, path: Path, data: Dict) -> None:
-        super().__init__(path)
+    def __init__(
+        self,
+        path: Path,
+        data: Mapping,
+        data_sources: Iterable[Path] = (),
+        cache: Optional[BuildCache] = None,
+        lazy: bool = False,
+        mtime: Optional[float] = None,
+    ) -> None:
+        super().__init__(path, mtime)
+        # The data files that contributed to data, in the order they were merged
+        self.data_sources = list(data_sources)
+        self.inherited_data = data
+        # Lazy page files only keep their metadata around, and read their body from
+        # disk again when rendered
+        self.lazy = lazy
+        self.permalink: Optional[str] = None
 
         with open(self.path) as infile:
-            metadata, self.content = frontmatter.parse(infile.read())
-
-        self.data = {**data, **metadata}
+            source = infile.read()
+        self.source_hash = hash_strings([source])
+
+        parsed = None
+        if cache is not None:
+            parsed = cache.get("frontmatter", self.source_hash)
+        if parsed is None:
+            with profiler.measure("frontmatter", str(self.path)):
+                parsed = frontmatter.parse(source)
+            if cache is not None:
+                cache.set("frontmatter", self.source_hash, parsed)
+        metadata, content = parsed
+        self._content: Optional[str] = None if lazy else content
+
+        if isinstance(data, ChainMap):
+            self.data = data.new_child(metadata)
+        else:
+            self.data = ChainMap(metadata, data)
 
         if "tags" in self.data:
             if isinstance(self.data["tags"], str):
@@ -169,30 +363,74 @@ class PageFile(SourceFile):
             self.tags = set()
 
         if "date" in self.data:
-            self.date = arrow.get(self.data["date"])
+            self.date = self.data["date"]
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            return read_content(self.path)
+        return self._content
+
+    @contextmanager
+    def loaded(self) -> Iterator[None]:
+        """Keep the body of a lazy page file in memory while its pages render"""
+        if not self.lazy or self._content is not None:
+            yield
+            return
+
+        self._content = read_content(self.path)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        self._content = None
+
+    def get_cache_key(self, cache: BuildCache) -> List[str]:
+        inherited_data = cache.fingerprint(self.inherited_data, memoise=True)
+        if inherited_data is None:
+            raise TypeError(f"Cannot fingerprint the data of {self.path}")
+        # Leaves out the mtime, which pages only depend on when they read dates
+        return [str(self.path), self.source_hash, inherited_data]
+
+    def get_pagination_data(self, collections: Mapping[str, Sequence]) -> Iterable:
+        pagination_source = self.data["pagination"]["data"]
+        if pagination_source in self.data:
+            return self.data[pagination_source]
+        elif pagination_source in collections:
+            return collections[pagination_source]
+        else:
+            raise MissingPaginationSourceException(pagination_source)
 
-    def get_pages(self, collections: Dict[str, List["PageFile"]]) -> List[SitePage]:
+    def is_streamed(self, collections: Mapping[str, Sequence]) -> bool:
+        """Whether the pages come from a generator or other iterable that can only be
+        paginated once"""
+        return "pagination" in self.data and not isinstance(
+            self.get_pagination_data(collections), Sequence
+        )
+
+    def get_pages(self, collections: Mapping[str, Sequence]) -> Iterator[SitePage]:
+        """Yield the pages of this file, one chunk of the pagination data at a time"""
         if "pagination" in self.data:
+            pagination_data = self.get_pagination_data(collections)
+            size = self.data["pagination"]["size"]
+            for index, items in enumerate(chunks(pagination_data, size)):
+                yield PaginationSitePage(self, self.data, collections, index, items)
+        else:
+            yield SitePage(self, self.data, collections)
 
-            pagination_source = self.data["pagination"]["data"]
+    def get_page(self, collections: Mapping[str, Sequence], number: int) -> SitePage:
+        """The page at number, without building the ones before it. Pagination
+        data has to be a sequence"""
+        if "pagination" not in self.data:
+            return SitePage(self, self.data, collections)
 
-            if pagination_source in self.data:
-                pagination_data = self.data[pagination_source]
-            elif pagination_source in collections:
-                pagination_data = collections[pagination_source]
-            else:
-                raise MissingPaginationSourceException(pagination_source)
-
-            pages: List[SitePage] = []
-            for index, items in enumerate(
-                chunks(pagination_data, self.data["pagination"]["size"])
-            ):
-                pages.append(
-                    PaginationSitePage(self, self.data, collections, index, items)
-                )
-            return pages
-        else:
-            return [SitePage(self, self.data, collections)]
+        size = self.data["pagination"]["size"]
+        items = self.get_pagination_data(collections)[
+            number * size : (number + 1) * size
+        ]
+        return PaginationSitePage(self, self.data, collections, number, items)
 
     def get_permalink(self):
         if "pagination" in self.data:
@@ -200,23 +438,97 @@ class PageFile(SourceFile):
                 "Cannot get a permalink from a PageFile with pagination"
             )
 
-        return SitePage(self, self.data, []).get_permalink()
+        if self.permalink is None:
+            self.permalink = SitePage(self, self.data, []).get_permalink()
+        return self.permalink
 
     def get_html(self, jinja2_env, **kwargs):
         return self.content
 
+    def get_referenced_templates(
+        self, template_dependencies: TemplateDependencies
+    ) -> Optional[Set[str]]:
+        return set()
+
 
 class MarkdownFile(PageFile):
     suffixes = {".md"}
 
+    extensions: List[Union[str, markdown.Extension]] = ["codehilite", "fenced_code"]
+    extension_configs: Dict[str, Dict[str, Any]] = {}
+    # Building a converter loads every extension, so each process keeps one around
+    # and resets it between documents
+    converter: Optional[markdown.Markdown] = None
+
+    @classmethod
+    def configure(
+        cls,
+        extensions: List[Union[str, markdown.Extension]],
+        extension_configs: Dict[str, Dict[str, Any]],
+    ) -> None:
+        if extensions != cls.extensions or extension_configs != cls.extension_configs:
+            cls.extensions = extensions
+            cls.extension_configs = extension_configs
+            cls.converter = None
+
+    @classmethod
+    def get_converter(cls) -> markdown.Markdown:
+        if cls.converter is None:
+            cls.converter = markdown.Markdown(
+                extensions=cls.extensions, extension_configs=cls.extension_configs
+            )
+        return cls.converter
+
+    def get_cache_key(self, cache: BuildCache) -> List[str]:
+        extensions = cache.fingerprint([self.extensions, self.extension_configs])
+        if extensions is None:
+            raise TypeError("Cannot fingerprint the markdown extensions")
+        return [*super().get_cache_key(cache), extensions]
+
     def get_html(self, _, **kwargs):
-        return markdown.markdown(self.content, extensions=["codehilite", "fenced_code"])
+        with profiler.measure("markdown", str(self.path)):
+            return self.get_converter().reset().convert(self.content)
 
 
 class Jinja2File(PageFile):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.template: Optional[jinja2.Template] = None
+
+    def get_template(self, jinja2_env: jinja2.Environment) -> jinja2.Template:
+        """Compile the page body once and share it between all of its pages"""
+        if self.template is not None and self.template.environment is jinja2_env:
+            return self.template
+
+        bytecode_cache = jinja2_env.bytecode_cache
+        if bytecode_cache is None:
+            self.template = jinja2_env.from_string(self.content)
+            return self.template
+
+        # Mirrors jinja2.BaseLoader.load, so unchanged page bodies aren't recompiled
+        # across rebuilds either
+        name = str(self.path)
+        bucket = bytecode_cache.get_bucket(jinja2_env, name, name, self.content)
+        if bucket.code is None:
+            bucket.code = jinja2_env.compile(self.content, name, name)
+            bytecode_cache.set_bucket(bucket)
+        self.template = jinja2_env.template_class.from_code(
+            jinja2_env, bucket.code, jinja2_env.make_globals(None), None
+        )
+        return self.template
+
     def get_html(self, jinja2_env, **kwargs):
-        template = jinja2_env.from_string(self.content)
-        return template.render(**kwargs)
+        with profiler.measure("jinja2", str(self.path)):
+            return self.get_template(jinja2_env).render(**kwargs)
+
+    def release(self) -> None:
+        super().release()
+        self.template = None
+
+    def get_referenced_templates(
+        self, template_dependencies: TemplateDependencies
+    ) -> Optional[Set[str]]:
+        return template_dependencies.of_source(self.content)
 
     suffixes = {".html", ".j2"}
 
@@ -226,6 +538,14 @@ class DataFile(SourceFile, ABC):
     def get_data(self):  # pragma: no cover
         return
 
+    async def get_data_async(self, executor: Executor, threaded: bool = False) -> Any:
+        """Load the data without blocking other files. With threaded, synchronous
+        loading happens in executor, so a timeout can stop waiting for it"""
+        if threaded:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, self.get_data)
+        return self.get_data()
+
 
 class JSONFile(DataFile):
     suffixes = {".json"}
@@ -237,17 +557,69 @@ class JSONFile(DataFile):
 
 class PythonFile(DataFile):
     suffixes = {".py"}
+    # How long the data may be reused for, from the module's CACHE_TTL
+    cache_ttl: Optional[float] = None
+
+    # Executed modules by resolved path, along with the stat they were loaded at
+    _modules: Dict[Path, Tuple[Tuple[int, int], ModuleType]] = {}
+    # Each module gets its own lock, so a slow import only holds up loading the
+    # same file again, and the shared lock is only held to look that lock up
+    _modules_lock = threading.Lock()
+    _module_locks: Dict[Path, threading.Lock] = {}
+
+    def get_module_name(self, path: Path) -> str:
+        """A name that can't collide with other data files or regular modules"""
+        return f"_skip_data_{hash_strings([str(path)])[:16]}_{path.stem}"
+
+    def load_module(self) -> Optional[ModuleType]:
+        if self.path.parent.name == "":
+            return None
+
+        path = self.path.resolve()
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._modules_lock:
+            module_lock = self._module_locks.setdefault(path, threading.Lock())
+        with module_lock:
+            if path in self._modules and self._modules[path][0] == key:
+                module = self._modules[path][1]
+            else:
+                name = self.get_module_name(path)
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[name] = module
+                try:
+                    spec.loader.exec_module(module)
+                except BaseException:
+                    del sys.modules[name]
+                    self._modules.pop(path, None)
+                    raise
+                self._modules[path] = (key, module)
+
+        self.cache_ttl = getattr(module, "CACHE_TTL", None)
+        return module
 
     def get_data(self) -> Any:
-        parent_path = str(self.path.parent)
-        if self.path.parent.name != "":
-            sys.path.append(parent_path)
-            module = __import__(self.path.stem)
-            importlib.reload(module)
-            data = module.get_data()
-            sys.path.remove(parent_path)
-
-            return data
+        module = self.load_module()
+        if module is not None:
+            if inspect.iscoroutinefunction(module.get_data):
+                return asyncio.run(module.get_data())
+            return module.get_data()
+
+    async def get_data_async(self, executor: Executor, threaded: bool = False) -> Any:
+        loop = asyncio.get_running_loop()
+        if threaded:
+            # Executing the module can be as slow as get_data
+            module = await loop.run_in_executor(executor, self.load_module)
+        else:
+            module = self.load_module()
+        if module is None:
+            return None
+        if inspect.iscoroutinefunction(module.get_data):
+            return await module.get_data()
+        if threaded or getattr(module, "THREADED", False):
+            return await loop.run_in_executor(executor, module.get_data)
+        return module.get_data()
 
 
 class DataFileFactory:
@@ -273,11 +645,23 @@ class PageFileFactory:
     def is_valid_file(self, path: Path) -> bool:
         return path.suffix in self.suffix_to_class_map
 
-    def load_source_file(self, path: Path, data: Dict) -> PageFile:
+    def __init__(self, cache: Optional[BuildCache] = None, lazy: bool = False) -> None:
+        self.cache = cache
+        self.lazy = lazy
+
+    def load_source_file(
+        self,
+        path: Path,
+        data: Mapping,
+        data_sources: Iterable[Path] = (),
+        mtime: Optional[float] = None,
+    ) -> PageFile:
         suffix = path.suffix
         if not self.is_valid_file(path):
             raise InvalidFileExtensionException(
                 f"No PageFile type found with suffix {suffix}"
             )
 
-        return self.suffix_to_class_map[suffix](path, data)
+        return self.suffix_to_class_map[suffix](
+            path, data, data_sources, self.cache, self.lazy, mtime
+        )
@@ -1,21 +1,327 @@
+import ctypes
+import ctypes.util
+import errno
+import os
 from os import DirEntry
+import re
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from watchgod import AllWatcher, DefaultWatcher
+import watchgod
+from watchgod import AllWatcher, Change, DefaultDirWatcher, DefaultWatcher
 
+from skip_ssg.cache import DEFAULT_CACHE_DIR
+
+FileChange = Tuple[Change, str]
+
+# Seconds without new events before a batch of changes is released, and the longest
+# a steady stream of events can hold one back
+DEFAULT_DEBOUNCE = 0.1
+DEFAULT_MAX_DELAY = 2.0
+
+# From linux/inotify.h
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# Closing after a write rather than every write, so half written files are skipped
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
 
-class SkipDefaultWatcher(DefaultWatcher):
-    def __init__(self, root_path: str) -> None:
-        self.ignored_dirs.add("_site")
-        super().__init__(root_path)
 
+class WatchFilter:
+    """Which directories and files the watchers look at
 
-class SkipIgnoreWatcher(AllWatcher):
-    def __init__(self, root_path: str, should_ignore=None) -> None:
+    Directories are skipped when their name is in ignore_dirs, like the build does
+    when looking for pages, or when their path relative to the root is, so an
+    output directory like "build/site" is skipped too.
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        ignore_dirs: Iterable[str] = (),
+        should_ignore: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.root_path = root_path
+        self.ignore_dirs = {*DefaultDirWatcher.ignored_dirs, DEFAULT_CACHE_DIR}
+        self.ignore_dirs |= {os.path.normpath(path) for path in ignore_dirs}
         self.should_ignore = should_ignore
+        self.ignored_files = [
+            re.compile(regex) for regex in DefaultWatcher.ignored_file_regexes
+        ]
+
+    def should_watch_dir(self, path: str, name: str) -> bool:
+        if name in self.ignore_dirs:
+            return False
+        if os.path.relpath(path, self.root_path) in self.ignore_dirs:
+            return False
+        return self.should_ignore is None or not self.should_ignore(path)
+
+    def should_watch_file(self, path: str, name: str) -> bool:
+        # Editor swap and backup files
+        if any(regex.search(name) for regex in self.ignored_files):
+            return False
+        return self.should_ignore is None or not self.should_ignore(path)
+
+
+class SkipDefaultWatcher(AllWatcher):
+    """Polls the tree for changes, for platforms without inotify"""
+
+    def __init__(
+        self,
+        root_path: str,
+        ignore_dirs: Iterable[str] = (),
+        should_ignore: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.filter = WatchFilter(root_path, ignore_dirs, should_ignore)
         super().__init__(root_path)
 
     def should_watch_dir(self, entry: DirEntry) -> bool:
-        return not self.should_ignore(entry.path)
+        return self.filter.should_watch_dir(entry.path, entry.name)
 
     def should_watch_file(self, entry: DirEntry) -> bool:
-        return not self.should_ignore(entry.path)
+        return self.filter.should_watch_file(entry.path, entry.name)
+
+
+class SkipIgnoreWatcher(SkipDefaultWatcher):
+    def __init__(
+        self, root_path: str, should_ignore=None, ignore_dirs: Iterable[str] = ()
+    ) -> None:
+        super().__init__(root_path, ignore_dirs, should_ignore)
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+
+def merge_change(changes: Dict[str, Change], path: str, change: Change) -> None:
+    """Fold another event for a path into the batch"""
+    previous = changes.get(path)
+    if previous == Change.added and change == Change.modified:
+        return
+    if previous == Change.added and change == Change.deleted:
+        # Created and removed within the batch, like an editor's temporary file
+        del changes[path]
+    elif previous == Change.deleted and change == Change.added:
+        # Replaced, which is how a lot of editors save
+        changes[path] = Change.modified
+    else:
+        changes[path] = change
+
+
+class InotifyWatcher:
+    """Gets told about changes by the kernel rather than walking the tree for them
+
+    Every watched directory needs its own inotify watch, so new directories are
+    added as they appear. Raises OSError if inotify can't be used, for example
+    when the limit on watches is reached.
+    """
+
+    def __init__(self, root_path: str, watch_filter: WatchFilter) -> None:
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root_path = root_path
+        self.filter = watch_filter
+        self.directories: Dict[int, str] = {}
+        try:
+            self.add_tree(root_path)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, path: str) -> bool:
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in {errno.ENOENT, errno.ENOTDIR}:
+                # Gone again before it could be watched
+                return False
+            raise OSError(error, f"Can't watch {path}: {os.strerror(error)}")
+        self.directories[wd] = path
+        return True
+
+    def add_tree(self, path: str, changes: Optional[Dict[str, Change]] = None) -> None:
+        """Watch path and every directory under it. With changes, the files found are
+        added to them, since they may have been written before the watch was"""
+        if not self.add_watch(path):
+            return
+        try:
+            entries = list(os.scandir(path))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if self.filter.should_watch_dir(entry.path, entry.name):
+                    self.add_tree(entry.path, changes)
+            elif changes is not None and self.filter.should_watch_file(
+                entry.path, entry.name
+            ):
+                merge_change(changes, entry.path, Change.added)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def read_changes(self, changes: Dict[str, Change]) -> bool:
+        """Add pending events to changes, returning whether some of them were lost
+        and everything has to be rebuilt"""
+        rebuild = False
+        for wd, mask, name in self.read_events():
+            if mask & IN_Q_OVERFLOW:
+                rebuild = True
+                continue
+            if mask & IN_IGNORED:
+                # The directory is gone
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if not self.filter.should_watch_dir(path, name):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path, changes)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    # The files that were in it aren't known without walking, so
+                    # rebuild everything like the first build does
+                    rebuild = True
+                continue
+
+            if not self.filter.should_watch_file(path, name):
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                merge_change(changes, path, Change.added)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                merge_change(changes, path, Change.deleted)
+            else:
+                merge_change(changes, path, Change.modified)
+        return rebuild
+
+    def watch(
+        self, debounce: float = DEFAULT_DEBOUNCE, max_delay: float = DEFAULT_MAX_DELAY
+    ) -> Iterator[Optional[Set[FileChange]]]:
+        """Yield batches of changes, or None when everything has to be rebuilt
+
+        A batch is released once no events have arrived for debounce seconds, so a
+        burst like a git checkout ends up as a single rebuild.
+        """
+        while True:
+            select.select([self.fd], [], [])
+            changes: Dict[str, Change] = {}
+            rebuild = False
+            start = time.monotonic()
+            while True:
+                rebuild |= self.read_changes(changes)
+                remaining = max_delay - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                if not select.select([self.fd], [], [], min(debounce, remaining))[0]:
+                    break
+
+            if rebuild:
+                # Pick up any directories whose events were lost
+                self.add_tree(self.root_path)
+                yield None
+            elif changes:
+                yield {(change, path) for path, change in changes.items()}
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def watch(
+    root_path: str,
+    ignore_dirs: Iterable[str] = (),
+    should_ignore: Optional[Callable[[str], bool]] = None,
+    debounce: float = DEFAULT_DEBOUNCE,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    polling: bool = False,
+) -> Iterator[Optional[Set[FileChange]]]:
+    """Yield batches of changes under root_path as they happen, using inotify where
+    it's available and polling otherwise. None means everything has to be rebuilt.
+    """
+    if not polling and _libc is not None:
+        try:
+            watcher = InotifyWatcher(
+                root_path, WatchFilter(root_path, ignore_dirs, should_ignore)
+            )
+        except OSError as e:
+            print(f"Can't watch with inotify ({e}), polling for changes instead")
+        else:
+            try:
+                yield from watcher.watch(debounce, max_delay)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                watcher.close()
+            return
+
+    if should_ignore is not None:
+        watcher_cls = SkipIgnoreWatcher
+        watcher_kwargs = {"should_ignore": should_ignore, "ignore_dirs": ignore_dirs}
+    else:
+        watcher_cls = SkipDefaultWatcher
+        watcher_kwargs = {"ignore_dirs": ignore_dirs}
+    # watchgod holds changes back until a check finds nothing new, so checking
+    # every debounce seconds gives the same batching as inotify
+    yield from watchgod.watch(
+        root_path,
+        watcher_cls=watcher_cls,
+        watcher_kwargs=watcher_kwargs,
+        debounce=int(max_delay * 1000),
+        min_sleep=int(debounce * 1000),
+    )
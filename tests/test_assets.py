@@ -0,0 +1,165 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+from skip_ssg import assets
+from skip_ssg.assets import (
+    AssetManifest,
+    AssetSync,
+    get_copy_targets,
+    hash_content,
+    sync_file,
+)
+from skip_ssg.cache import BuildCache
+
+
+class TestSyncFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.src = self.root / "src.css"
+        with open(self.src, "w+") as outfile:
+            outfile.write("body {}")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_skips_unchanged_files(self):
+        dest = self.root / "out" / "dest.css"
+        self.assertTrue(sync_file(self.src, dest))
+        self.assertFalse(sync_file(self.src, dest))
+
+        with open(self.src, "w+") as outfile:
+            outfile.write("body { color: red }")
+        self.assertTrue(sync_file(self.src, dest))
+        with open(dest) as infile:
+            self.assertEqual(infile.read(), "body { color: red }")
+
+    def test_links_files(self):
+        dest = self.root / "dest.css"
+        sync_file(self.src, dest, link=True)
+        self.assertEqual(os.stat(dest).st_ino, os.stat(self.src).st_ino)
+
+        # A replaced source gets linked again rather than written through the old
+        # link
+        replacement = self.root / "replacement.css"
+        with open(replacement, "w+") as outfile:
+            outfile.write("body { color: red }")
+        os.replace(replacement, self.src)
+        self.assertTrue(sync_file(self.src, dest, link=True))
+        self.assertEqual(os.stat(dest).st_ino, os.stat(self.src).st_ino)
+
+
+class TestAssetSync(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.site_dir = self.root / "_site"
+        for name in ["static/a.css", "static/img/b.png", "robots.txt"]:
+            self.write(self.root / name, name)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write(self, path: Path, content: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w+") as outfile:
+            outfile.write(content)
+
+    def sync(
+        self, keep: set = set(), manifest: Optional[AssetManifest] = None
+    ) -> AssetSync:
+        asset_sync = AssetSync(self.site_dir, jobs=2, manifest=manifest)
+        asset_sync.start(
+            get_copy_targets(
+                [f"{self.root / 'static'}:static", f"{self.root / 'robots.txt'}:."],
+                self.site_dir,
+            )
+        )
+        asset_sync.wait()
+        asset_sync.remove_stale(keep)
+        return asset_sync
+
+    def test_copies_only_changed_files(self):
+        self.assertEqual(len(self.sync().copied), 3)
+        self.assertTrue((self.site_dir / "static" / "img" / "b.png").exists())
+        self.assertTrue((self.site_dir / "robots.txt").exists())
+
+        self.write(self.root / "static" / "a.css", "changed")
+        asset_sync = self.sync()
+        self.assertEqual(asset_sync.copied, {self.site_dir / "static" / "a.css"})
+        self.assertEqual(asset_sync.unchanged, 2)
+
+    def test_removes_stale_files(self):
+        self.sync()
+        os.remove(self.root / "static" / "img" / "b.png")
+        page = self.site_dir / "static" / "index.html"
+        self.write(page, "<h1>Static</h1>")
+
+        self.sync({page})
+        self.assertFalse((self.site_dir / "static" / "img" / "b.png").exists())
+        self.assertTrue(page.exists())
+
+    def test_keeps_files_of_unchanged_targets(self):
+        self.write(self.root / "images" / "logo.png", "logo")
+        static = (self.root / "static", Path("."))
+        images = (self.root / "images", Path("img"))
+        asset_sync = AssetSync(self.site_dir, jobs=2)
+        asset_sync.start([static, images])
+        asset_sync.wait()
+
+        # Only static changed, but its destination holds img/ too
+        self.write(self.root / "static" / "a.css", "changed")
+        asset_sync = AssetSync(self.site_dir, jobs=2)
+        asset_sync.start([static], [images])
+        self.assertEqual(asset_sync.wait(), {self.site_dir / "a.css"})
+        asset_sync.remove_stale(set())
+        self.assertTrue((self.site_dir / "img" / "logo.png").exists())
+
+    def test_copies_to_fingerprinted_names(self):
+        manifest = AssetManifest()
+        manifest.add(self.root / "static", Path("static"))
+        self.sync(manifest=manifest)
+
+        url = manifest("/static/a.css")
+        self.assertRegex(url, r"^/static/a\.[0-9a-f]{8}\.css$")
+        self.assertTrue((self.site_dir / url.lstrip("/")).exists())
+        self.assertFalse((self.site_dir / "static" / "a.css").exists())
+        self.assertEqual(manifest("robots.txt"), "/robots.txt")
+
+        # The old version goes once the file changes
+        self.write(self.root / "static" / "a.css", "changed")
+        manifest = AssetManifest()
+        manifest.add(self.root / "static", Path("static"))
+        self.sync(manifest=manifest)
+        self.assertNotEqual(manifest("static/a.css"), url)
+        self.assertFalse((self.site_dir / url.lstrip("/")).exists())
+
+
+class TestHashContent(unittest.TestCase):
+    def test_reuses_hashes_of_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "a.css"
+            with open(path, "w+") as outfile:
+                outfile.write("body {}")
+            stat = os.stat(path)
+            cache = BuildCache(Path(td) / "cache")
+
+            with patch.dict(assets._content_hashes, clear=True):
+                digest = hash_content(path, cache)
+
+            # Same size and mtime, so the cached hash is used without reading it
+            with open(path, "w+") as outfile:
+                outfile.write("body{ }")
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            with patch.dict(assets._content_hashes, clear=True):
+                self.assertEqual(hash_content(path, cache), digest)
+            with patch.dict(assets._content_hashes, clear=True):
+                self.assertNotEqual(hash_content(path), digest)
@@ -0,0 +1,33 @@
+import contextlib
+import io
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from benchmarks.generate import generate_site
+from skip_ssg import skip
+
+
+class TestGenerateSite(unittest.TestCase):
+    def test_generated_site_builds(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as td:
+            generate_site(
+                Path(td), markdown_pages=5, jinja_pages=5, tags=2, pagination_size=2
+            )
+            os.chdir(td)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    skip.build_site(
+                        {"output": "_site", "copy": [], "fail_on_error": True},
+                        skip.false,
+                    )
+            finally:
+                os.chdir(cwd)
+
+            site_dir = Path(td) / "_site"
+            self.assertTrue((site_dir / "index.html").exists())
+            self.assertTrue((site_dir / "tags" / "tag0" / "index.html").exists())
+            self.assertTrue((site_dir / "records" / "index.html").exists())
+            self.assertTrue(any(site_dir.glob("**/post_0/index.html")))
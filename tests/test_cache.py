@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+import arrow
+
+from skip_ssg.cache import BuildCache
+from skip_ssg.sources import MarkdownFile
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = BuildCache(self.temp_dir.name)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_round_trips_values(self):
+        self.assertIsNone(self.cache.get("html", "abc"))
+        self.cache.set("html", "abc", "<h1>Hello</h1>")
+        self.assertEqual(self.cache.get("html", "abc"), "<h1>Hello</h1>")
+
+    def test_prune_evicts_least_recently_used(self):
+        for key in ["aa", "bb", "cc"]:
+            self.cache.set("html", key, "x" * 100)
+        # Make "aa" the oldest entry, then use "bb" so it's the newest
+        os.utime(self.cache._entry_path("html", "aa"), (0, 0))
+        os.utime(self.cache._entry_path("html", "cc"), (1, 1))
+        self.cache.get("html", "bb")
+
+        entry_size = os.path.getsize(self.cache._entry_path("html", "aa"))
+        self.cache.max_size = entry_size
+        self.cache.prune()
+
+        self.assertIsNone(self.cache.get("html", "aa"))
+        self.assertIsNone(self.cache.get("html", "cc"))
+        self.assertIsNotNone(self.cache.get("html", "bb"))
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(
+            self.cache.fingerprint({"a": 1, "b": {2, 1}, "c": arrow.get(0)}),
+            BuildCache().fingerprint({"b": {1, 2}, "c": arrow.get(0), "a": 1}),
+        )
+
+    def test_fingerprint_rejects_unknown_objects(self):
+        self.assertIsNone(self.cache.fingerprint({"a": object()}))
+
+    def test_reuses_frontmatter(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "a.md"
+            with open(path, "w+") as outfile:
+                outfile.write("---\ntitle: A\n---\n# A")
+
+            page_file = MarkdownFile(path, {}, cache=self.cache)
+            cached = self.cache.get("frontmatter", page_file.source_hash)
+            self.assertEqual(cached, ({"title": "A"}, "# A"))
+
+            self.cache.set("frontmatter", page_file.source_hash, ({"x": 1}, "y"))
+            page_file = MarkdownFile(path, {}, cache=self.cache)
+            self.assertEqual(page_file.data, {"x": 1})
@@ -0,0 +1,75 @@
+import unittest
+
+import arrow
+
+from skip_ssg.collection import Collection, Collections
+
+
+class FakePage:
+    def __init__(self, name: str, date: str, tags: set) -> None:
+        self.name = name
+        self.date = arrow.get(date)
+        self.timestamp = self.date.timestamp()
+        self.tags = tags
+
+
+class FakeSitePage:
+    def __init__(self, source: FakePage) -> None:
+        self.source = source
+
+
+class TestCollections(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pages = [
+            FakePage("c", "2021-03-01", {"posts", "python"}),
+            FakePage("a", "2020-01-01", {"posts"}),
+            FakePage("d", "2021-04-01", {"notes"}),
+            FakePage("b", "2020-06-01", {"posts", "python"}),
+        ]
+        self.collections = Collections(self.pages)
+        return super().setUp()
+
+    def names(self, pages) -> list:
+        return [page.name for page in pages]
+
+    def test_sorts_on_first_access(self):
+        self.assertEqual(set(self.collections), {"all", "notes", "posts", "python"})
+        self.assertIsNone(self.collections._collections)
+
+        self.assertEqual(self.names(self.collections["all"]), ["a", "b", "c", "d"])
+        self.assertEqual(self.names(self.collections["posts"]), ["a", "b", "c"])
+
+    def test_missing_tags_are_empty(self):
+        self.assertEqual(len(self.collections["missing"]), 0)
+        self.assertNotIn("missing", self.collections)
+        self.assertIsNone(self.collections.get("missing"))
+
+    def test_slices_and_reverses(self):
+        posts = self.collections["posts"]
+        self.assertEqual(self.names(posts[-2:]), ["b", "c"])
+        self.assertEqual(self.names(posts.reverse()), ["c", "b", "a"])
+        self.assertEqual(self.names(posts), ["a", "b", "c"])
+
+    def test_indexes(self):
+        posts = self.collections["posts"]
+        self.assertEqual(
+            {year: self.names(pages) for year, pages in posts.by_year.items()},
+            {2020: ["a", "b"], 2021: ["c"]},
+        )
+        self.assertEqual(
+            list(self.collections["all"].tag_counts.items()),
+            [("posts", 3), ("python", 2), ("notes", 1)],
+        )
+
+    def test_neighbours(self):
+        python = self.collections["python"]
+        b, c = python
+        self.assertIsNone(python.previous(b))
+        self.assertIs(python.next(b), c)
+        self.assertIs(python.previous(FakeSitePage(c)), b)
+        self.assertIsNone(python.next(c))
+        self.assertIsNone(python.next(self.pages[2]))
+
+    def test_compares_like_a_list(self):
+        self.assertEqual(Collection([1, 2]), [1, 2])
+        self.assertEqual(Collection([1, 2]), Collection([1, 2]))
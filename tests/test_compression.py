@@ -0,0 +1,51 @@
+import gzip
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from skip_ssg.compression import Compressor, compress_page
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "index.html"
+        self.gz = Path(self.temp_dir.name) / "index.html.gz"
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_writes_sidecars(self):
+        content = b"<p>Hello</p>" * 100
+        compress_page(self.path, content, min_size=10)
+        with open(self.gz, "rb") as infile:
+            self.assertEqual(gzip.decompress(infile.read()), content)
+
+    def test_removes_sidecars_below_min_size(self):
+        compress_page(self.path, b"<p>Hello</p>" * 100, min_size=10)
+        compress_page(self.path, b"<p>Hi</p>", min_size=10)
+        self.assertFalse(self.gz.exists())
+
+    def test_compresses_missing_sidecars(self):
+        compressor = Compressor(jobs=2, min_size=10)
+        self.assertFalse(compressor.is_missing(self.path, 5))
+        self.assertTrue(compressor.is_missing(self.path, 50))
+
+        with open(self.path, "wb") as outfile:
+            outfile.write(b"<p>Hello</p>" * 100)
+        self.assertTrue(compressor.is_missing(self.path, 50))
+        compressor.submit(self.path, b"<p>Hello</p>" * 100)
+        compressor.wait()
+        self.assertFalse(compressor.is_missing(self.path, 50))
+
+    def test_compresses_stale_sidecars(self):
+        compress_page(self.path, b"<p>Old</p>" * 100, min_size=10)
+        with open(self.path, "wb") as outfile:
+            outfile.write(b"<p>New</p>" * 100)
+        stat = os.stat(self.gz)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertTrue(Compressor(min_size=10).is_missing(self.path, 1000))
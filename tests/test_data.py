@@ -0,0 +1,239 @@
+from pathlib import Path
+import sys
+import tempfile
+import time
+import unittest
+
+from skip_ssg.cache import BuildCache
+from skip_ssg.data import DataCache, DataLoader
+from skip_ssg.sources import JSONFile, PythonFile
+
+ASYNC_MODULE = """
+import asyncio
+
+async def get_data():
+    await asyncio.sleep({delay})
+    return {{"value": "{name}", "{name}": True}}
+"""
+
+THREADED_MODULE = """
+import time
+
+THREADED = True
+
+def get_data():
+    time.sleep({delay})
+    return {{"value": "{name}", "{name}": True}}
+"""
+
+SYNC_MODULE = """
+import time
+
+def get_data():
+    time.sleep({delay})
+    return {{"value": "{name}", "{name}": True}}
+"""
+
+COUNTING_MODULE = """
+import os
+
+CACHE_TTL = {ttl}
+
+def get_data():
+    with open(os.path.join(os.path.dirname(__file__), "calls"), "a") as outfile:
+        outfile.write("x")
+    return {{"value": "{name}"}}
+"""
+
+SLOW_IMPORT_MODULE = """
+import time
+
+time.sleep({delay})
+
+def get_data():
+    return {{"value": "{name}", "{name}": True}}
+"""
+
+GENERATOR_MODULE = """
+CACHE_TTL = 60
+
+def get_data():
+    return (row for row in range(3))
+"""
+
+
+class TestDataLoader(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "data"
+        self.root.mkdir()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write_module(
+        self, name: str, source: str, delay: float = 0, ttl: str = "None"
+    ) -> PythonFile:
+        path = self.root / f"{name}.py"
+        with open(path, "w+") as outfile:
+            outfile.write(source.format(name=name, delay=delay, ttl=ttl))
+        return PythonFile(path)
+
+    def test_loads_async_files_concurrently(self):
+        data_files = [
+            self.write_module(f"async_loader_{i}", ASYNC_MODULE, 0.2) for i in range(4)
+        ]
+
+        start = time.perf_counter()
+        data = DataLoader(True).load(data_files)
+
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertTrue(all(f"async_loader_{i}" in data for i in range(4)))
+
+    def test_loads_threaded_files_concurrently(self):
+        data_files = [
+            self.write_module(f"threaded_loader_{i}", THREADED_MODULE, 0.2)
+            for i in range(4)
+        ]
+
+        start = time.perf_counter()
+        DataLoader(True).load(data_files)
+        self.assertLess(time.perf_counter() - start, 0.6)
+
+    def test_merges_in_order(self):
+        slow = self.write_module("ordered_slow", ASYNC_MODULE, 0.2)
+        fast = self.write_module("ordered_fast", ASYNC_MODULE, 0)
+
+        self.assertEqual(DataLoader(True).load([fast, slow])["value"], "ordered_slow")
+        self.assertEqual(DataLoader(True).load([slow, fast])["value"], "ordered_fast")
+
+    def test_times_out(self):
+        slow = self.write_module("timeout_slow", ASYNC_MODULE, 5)
+        json_file = JSONFile(Path("tests/files/my-data.json"))
+
+        with self.assertRaises(TimeoutError):
+            DataLoader(True, timeout=0.1).load([slow])
+
+        data = DataLoader(False, timeout=0.1).load([slow, json_file])
+        self.assertEqual(data, {"a": 1})
+
+    def test_times_out_synchronous_files(self):
+        slow = self.write_module("timeout_sync", SYNC_MODULE, 1)
+
+        start = time.perf_counter()
+        with self.assertRaises(TimeoutError):
+            DataLoader(True, timeout=0.1).load([slow])
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_slow_imports_dont_hold_up_other_files(self):
+        slow = self.write_module("import_slow", SLOW_IMPORT_MODULE, 1)
+        fast = self.write_module("import_fast", SYNC_MODULE, 0)
+        other = self.write_module("import_other", SYNC_MODULE, 0)
+
+        start = time.perf_counter()
+        data = DataLoader(False, timeout=0.3).load([slow, fast, other])
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertNotIn("import_slow", data)
+        self.assertTrue(data["import_fast"])
+        self.assertTrue(data["import_other"])
+
+    def get_calls(self) -> int:
+        try:
+            with open(self.root / "calls") as infile:
+                return len(infile.read())
+        except FileNotFoundError:
+            return 0
+
+    def test_caches_python_data_with_ttl(self):
+        cache = DataCache()
+        data_file = self.write_module("cached_ttl", COUNTING_MODULE, ttl="60")
+
+        for _ in range(3):
+            data = DataLoader(True, cache=cache).load([PythonFile(data_file.path)])
+        self.assertEqual(data, {"value": "cached_ttl"})
+        self.assertEqual(self.get_calls(), 1)
+
+        # Editing the file invalidates its entry
+        with open(data_file.path, "a") as outfile:
+            outfile.write("\n")
+        DataLoader(True, cache=cache).load([PythonFile(data_file.path)])
+        self.assertEqual(self.get_calls(), 2)
+
+    def test_never_caches_generators(self):
+        data_file = self.write_module("rows", GENERATOR_MODULE)
+        loader = DataLoader(True, cache=DataCache())
+        self.assertEqual(list(loader.load([data_file])["rows"]), [0, 1, 2])
+        self.assertEqual(list(loader.load([data_file])["rows"]), [0, 1, 2])
+
+    def test_expires_python_data(self):
+        cache = DataCache()
+        data_file = self.write_module("cached_expired", COUNTING_MODULE, ttl="0.1")
+
+        DataLoader(True, cache=cache).load([data_file])
+        DataLoader(True, cache=cache).load([data_file])
+        self.assertEqual(self.get_calls(), 1)
+        time.sleep(0.15)
+        DataLoader(True, cache=cache).load([data_file])
+        self.assertEqual(self.get_calls(), 2)
+
+    def test_only_caches_python_data_with_a_ttl(self):
+        cache = DataCache()
+        data_file = self.write_module("cached_none", COUNTING_MODULE, ttl="None")
+
+        DataLoader(True, cache=cache).load([data_file])
+        DataLoader(True, cache=cache).load([data_file])
+        self.assertEqual(self.get_calls(), 2)
+
+        DataLoader(True, cache=cache, default_ttl=60).load([data_file])
+        DataLoader(True, cache=cache, default_ttl=60).load([data_file])
+        self.assertEqual(self.get_calls(), 3)
+
+    def test_persists_python_data(self):
+        data_file = self.write_module("cached_persist", COUNTING_MODULE, ttl="60")
+        persistent_cache = BuildCache(Path(self.temp_dir.name) / "cache")
+
+        for _ in range(2):
+            loader = DataLoader(
+                True, cache=DataCache(), persistent_cache=persistent_cache
+            )
+            self.assertEqual(loader.load([data_file]), {"value": "cached_persist"})
+        self.assertEqual(self.get_calls(), 1)
+
+
+class TestPythonFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write_module(self, path: Path, value: str) -> PythonFile:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w+") as outfile:
+            outfile.write("EXECUTIONS = []\nEXECUTIONS.append(1)\n")
+            outfile.write(f"def get_data():\n    return {{'value': '{value}'}}\n")
+        return PythonFile(path)
+
+    def test_same_names_in_different_directories(self):
+        sys_path = list(sys.path)
+        a = self.write_module(self.root / "a" / "site.py", "a")
+        b = self.write_module(self.root / "b" / "site.py", "b")
+
+        self.assertEqual(a.get_data(), {"value": "a"})
+        self.assertEqual(b.get_data(), {"value": "b"})
+        self.assertEqual(sys.path, sys_path)
+
+    def test_executes_modules_once_until_changed(self):
+        data_file = self.write_module(self.root / "data" / "once.py", "before")
+        module = data_file.load_module()
+        self.assertIs(PythonFile(data_file.path).load_module(), module)
+        self.assertEqual(module.EXECUTIONS, [1])
+
+        data_file = self.write_module(self.root / "data" / "once.py", "after!")
+        self.assertIsNot(data_file.load_module(), module)
+        self.assertEqual(data_file.get_data(), {"value": "after!"})
@@ -0,0 +1,110 @@
+from pathlib import Path
+import unittest
+
+import jinja2
+
+from skip_ssg.collection import Collections
+from skip_ssg.dependencies import (
+    DependencyGraph,
+    PageDependencies,
+    TemplateDependencies,
+    TrackedCollections,
+)
+
+
+class TestTrackedCollections(unittest.TestCase):
+    def test_records_accessed_collections(self):
+        collections = TrackedCollections({"posts": [1], "all": [1, 2]})
+        self.assertEqual(collections["posts"], [1])
+        self.assertFalse("missing" in collections)
+
+        self.assertEqual(collections.accessed, {"posts", "missing"})
+        self.assertFalse(collections.accessed_all)
+
+    def test_iteration_uses_all_collections(self):
+        collections = TrackedCollections({"posts": [1]})
+        list(collections.items())
+        self.assertTrue(collections.accessed_all)
+
+    def test_missing_tags_are_not_contained(self):
+        collections = TrackedCollections(Collections([]))
+        self.assertFalse("drafts" in collections)
+        self.assertEqual(collections.accessed, {"drafts"})
+        self.assertFalse(collections.accessed_all)
+
+    def test_records_jinja2_attribute_access(self):
+        collections = TrackedCollections({"posts": ["a"]})
+        jinja2.Environment().from_string("{{ collections.posts }}").render(
+            collections=collections
+        )
+        self.assertEqual(collections.accessed, {"posts"})
+
+
+class TestTemplateDependencies(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.jinja2_env = jinja2.Environment(
+            loader=jinja2.DictLoader(
+                {
+                    "base.html": '{% include "footer.html" %}{{ content }}',
+                    "footer.html": "<footer></footer>",
+                    "dynamic.html": "{% include data.footer %}",
+                }
+            )
+        )
+        return super().setUpClass()
+
+    def test_finds_nested_templates(self):
+        template_dependencies = TemplateDependencies(self.jinja2_env)
+        self.assertEqual(
+            template_dependencies.of_template("base.html"),
+            {"base.html", "footer.html"},
+        )
+
+    def test_finds_templates_in_source(self):
+        template_dependencies = TemplateDependencies(self.jinja2_env)
+        self.assertEqual(
+            template_dependencies.of_source('{% extends "base.html" %}'),
+            {"base.html", "footer.html"},
+        )
+
+    def test_dynamic_template_is_unknown(self):
+        template_dependencies = TemplateDependencies(self.jinja2_env)
+        self.assertIsNone(template_dependencies.of_template("dynamic.html"))
+
+
+class TestPageDependencies(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dependencies = PageDependencies(
+            Path("blog/post.md"), [Path("data/site.json")], {"base.html"}, {"posts"}
+        )
+        return super().setUp()
+
+    def test_affected_by_source_data_and_templates(self):
+        for path in ["blog/post.md", "data/site.json", "templates/base.html"]:
+            self.assertTrue(self.dependencies.is_affected({Path(path)}, set()))
+
+    def test_affected_by_collections(self):
+        self.assertTrue(self.dependencies.is_affected(set(), {"posts"}))
+        self.assertFalse(self.dependencies.is_affected(set(), {"drafts"}))
+
+    def test_not_affected_by_unrelated_changes(self):
+        self.assertFalse(
+            self.dependencies.is_affected(
+                {Path("other.md"), Path("templates/other.html")}, set()
+            )
+        )
+
+    def test_dynamic_templates_affected_by_any_template(self):
+        dependencies = PageDependencies(Path("a.md"), [], None, set())
+        self.assertTrue(dependencies.is_affected({Path("templates/other.html")}, set()))
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def test_changed_collections_include_old_and_new_tags(self):
+        graph = DependencyGraph()
+        graph.add_source(Path("a.md"), {"old"})
+        graph.add_source(Path("b.md"), {"untouched"})
+
+        changed = graph.get_changed_collections({Path("a.md")}, {Path("a.md"): {"new"}})
+        self.assertEqual(changed, {"all", "old", "new"})
@@ -0,0 +1,65 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from skip_ssg.cache import BuildCache
+from skip_ssg.minify import Minifier, minify_css, minify_html
+
+
+class TestMinify(unittest.TestCase):
+    def test_collapses_whitespace(self):
+        self.assertEqual(
+            minify_html(
+                "<html>\n  <body>\n    <!-- nav -->\n"
+                '    <p>Hello   <a href="/">there</a>\n    <b>you</b></p>\n'
+                "  </body>\n</html>\n"
+            ),
+            '<html><body><p>Hello <a href="/">there</a> <b>you</b></p></body></html>',
+        )
+
+    def test_keeps_preformatted_text(self):
+        html = "<div><pre>  a\n    b </pre></div>"
+        self.assertEqual(minify_html(html), html)
+
+    def test_minifies_inline_css_and_js(self):
+        self.assertEqual(
+            minify_html(
+                "<style>\n  a :hover {\n    color: red;\n  }\n</style>\n"
+                "<script>\n  var a = 1;\n\n  var b = 2;\n</script>"
+            ),
+            "<style>a :hover{color:red}</style><script>var a = 1;\nvar b = 2;</script>",
+        )
+
+    def test_leaves_css_strings_alone(self):
+        self.assertEqual(
+            minify_css('a::after { content: "x ;  /* y */ }" ; }'),
+            'a::after{content:"x ;  /* y */ }"}',
+        )
+
+
+class TestMinifier(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.calls = []
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def minify(self, html: str) -> str:
+        self.calls.append(html)
+        return html.strip()
+
+    def test_caches_by_content(self):
+        Minifier(self.minify, BuildCache(self.temp_dir.name))(" <p>a</p> ")
+        minifier = Minifier(self.minify, BuildCache(self.temp_dir.name))
+
+        self.assertEqual(minifier(" <p>a</p> "), "<p>a</p>")
+        self.assertEqual(minifier(" <p>b</p> "), "<p>b</p>")
+        self.assertEqual(self.calls, [" <p>a</p> ", " <p>b</p> "])
+
+    def test_only_minifies_html(self):
+        minifier = Minifier()
+        self.assertTrue(minifier.applies_to(Path("index.html")))
+        self.assertFalse(minifier.applies_to(Path("feed.xml")))
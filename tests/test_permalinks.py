@@ -0,0 +1,63 @@
+from pathlib import Path
+import unittest
+
+import jinja2
+
+from skip_ssg.permalinks import PermalinkCollisionException, get_permalink_index
+from skip_ssg.sources import Jinja2File
+
+
+class TestPermalinkIndex(unittest.TestCase):
+    def test_indexes_pages_by_path_and_url(self):
+        page_file = Jinja2File(Path("tests/files/pagination2.j2"), {})
+        index = get_permalink_index([page_file], {})
+
+        self.assertEqual(len(list(index.get_pages(page_file))), 3)
+        self.assertIn(Path("tests/files/pagination2/1/index.html"), index.pages_by_path)
+        self.assertEqual(
+            index.pages_by_url["/tests/files/pagination2/1/"].items, ["c", "d"]
+        )
+
+    def test_builds_pages_on_lookup(self):
+        page_file = Jinja2File(
+            Path("tests/files/pagination.j2"), {"a": [str(i) for i in range(1000)]}
+        )
+        index = get_permalink_index([page_file], {})
+
+        path = Path("tests/files/pagination/999/index.html")
+        self.assertEqual(index.pages_by_path.locations[path], (page_file, 999, path))
+
+        page = index.pages_by_url["/tests/files/pagination/999/"]
+        self.assertEqual(page.items, ["999"])
+        # Resolved while indexing, so the permalink isn't rendered again
+        self.assertEqual(page.path, path)
+
+    def test_raises_on_collision(self):
+        page_a = Jinja2File(Path("tests/files/tags.html"), {"permalink": "/a/"})
+        page_b = Jinja2File(Path("tests/files/pagination.j2"), {"permalink": "a/"})
+
+        with self.assertRaises(PermalinkCollisionException) as context:
+            get_permalink_index([page_a, page_b], {"a": ["dummy"]})
+        self.assertTrue("a/index.html" in str(context.exception))
+
+    def test_templates_look_up_pages_by_url(self):
+        page_file = Jinja2File(Path("tests/files/tags.html"), {"title": "Tags"})
+        index = get_permalink_index([page_file], {})
+
+        page = next(index.get_pages(page_file))
+        page_file.template = jinja2.Environment().from_string(
+            '{{ pages_by_url["/tests/files/tags/"].data.title }}'
+        )
+        html = page.render(page_file.template.environment, index.pages_by_url)
+
+        self.assertEqual(html, "Tags")
+        self.assertEqual(page.used_collections.accessed, {"all"})
+
+    def test_leaves_streamed_pagination_to_rendering(self):
+        page_file = Jinja2File(
+            Path("tests/files/pagination.j2"), {"a": (str(i) for i in range(3))}
+        )
+        index = get_permalink_index([page_file], {})
+
+        self.assertIsNone(index.get_pages(page_file))
+        self.assertEqual(index.pages_by_path, {})
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+
+from skip_ssg.profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        profiler = Profiler()
+        with profiler.measure("data", "a.json"):
+            pass
+        self.assertEqual(profiler.events, [])
+
+    def test_records_measurements(self):
+        profiler = Profiler()
+        profiler.start()
+        with profiler.measure("markdown", "a.md"):
+            pass
+        profiler.stop()
+
+        self.assertEqual(len(profiler.events), 1)
+        phase, name, _, duration, _ = profiler.events[0]
+        self.assertEqual((phase, name), ("markdown", "a.md"))
+        self.assertGreaterEqual(duration, 0)
+
+    def test_reports_slowest_pages(self):
+        profiler = Profiler()
+        profiler.start()
+        profiler.record("markdown", "a.md", 0, 1)
+        profiler.record("write", "a.md", 1, 1)
+        profiler.record("jinja2", "b.html", 0, 3)
+        profiler.record("data", "c.json", 0, 5)
+
+        self.assertEqual(
+            profiler.to_json(top=1),
+            {
+                "phases": {
+                    "markdown": {"total": 1, "count": 1},
+                    "write": {"total": 1, "count": 1},
+                    "jinja2": {"total": 3, "count": 1},
+                    "data": {"total": 5, "count": 1},
+                },
+                "pages": [{"path": "b.html", "total": 3}],
+                "data_files": [{"path": "c.json", "total": 5}],
+            },
+        )
+
+    def test_writes_chrome_trace(self):
+        profiler = Profiler()
+        profiler.start()
+        profiler.record("jinja2", "b.html", 1, 2)
+
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "trace.json")
+            profiler.write(path, "chrome")
+            with open(path) as infile:
+                trace = json.load(infile)
+
+        event = trace["traceEvents"][0]
+        self.assertEqual(event["ph"], "X")
+        self.assertEqual((event["ts"], event["dur"]), (1e6, 2e6))
@@ -0,0 +1,65 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+from skip_ssg.minify import Minifier
+from skip_ssg.permalinks import get_permalink_index
+from skip_ssg.rendering import PageRenderer, create_jinja_env, render_page_files
+from skip_ssg.sources import Jinja2File
+
+
+class TestRenderPageFiles(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        td = Path(self.temp_dir.name)
+        self.page_files = []
+        for i in range(10):
+            path = td / f"page{i}.html"
+            with open(path, "w+") as outfile:
+                outfile.write(f"<p>{{{{ data.title }}}} {i}</p>")
+            self.page_files.append(Jinja2File(path, {"title": "Page"}))
+        self.td = td
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_renders_serially(self):
+        rendered = list(render_page_files(self.page_files, PageRenderer({})))
+        self.assertEqual(len(rendered), 10)
+        self.assertEqual(rendered[3].html, "<p>Page 3</p>")
+
+    def test_parallel_output_matches_serial(self):
+        serial = list(render_page_files(self.page_files, PageRenderer({})))
+        parallel = list(render_page_files(self.page_files, PageRenderer({}), jobs=3))
+
+        self.assertEqual(
+            [(page.path, page.html) for page in serial],
+            [(page.path, page.html) for page in parallel],
+        )
+
+    def test_minifies_in_workers(self):
+        renderer = PageRenderer({}, minifier=Minifier(str.upper))
+        parallel = list(render_page_files(self.page_files, renderer, jobs=3))
+        self.assertEqual(parallel[3].html, "<P>PAGE 3</P>")
+
+    def test_streams_pagination_over_generators(self):
+        page_file = Jinja2File(
+            Path("tests/files/pagination.j2"), {"a": (str(i) for i in range(5))}
+        )
+        renderer = PageRenderer({}, index=get_permalink_index([page_file], {}))
+
+        rendered = list(render_page_files([page_file], renderer))
+        self.assertEqual(len(rendered), 5)
+        self.assertEqual(rendered[4].path, Path("tests/files/pagination/4/index.html"))
+
+    def test_serialises_page_data_to_json(self):
+        path = self.td / "feed.json.j2"
+        with open(path, "w+") as outfile:
+            outfile.write("---\ntitle: Feed\n---\n{{ data | tojson }}")
+        page_file = Jinja2File(path, {"site": {"name": "Site"}})
+
+        page = next(page_file.get_pages({}))
+        html = page.render(create_jinja_env())
+        self.assertEqual(html, '{"site": {"name": "Site"}, "title": "Feed"}')
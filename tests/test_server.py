@@ -0,0 +1,141 @@
+import functools
+import gzip
+import http.client
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+import unittest
+
+from skip_ssg import server
+from skip_ssg.dependencies import DependencyGraph
+
+
+class ServerTestCase(unittest.TestCase):
+    live_reload = False
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.write("index.html", b"<h1>Home</h1>")
+        self.write("post/index.html", b"<h1>Post</h1>")
+
+        handler = functools.partial(
+            server.QuietHander,
+            directory=str(self.root),
+            live_reload=self.live_reload,
+        )
+        self.httpd = server.SkipServer(("localhost", 0), handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection(
+            "localhost", self.httpd.server_address[1]
+        )
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        server.live_reload.close()
+        self.connection.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        server.file_cache.clear()
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write(self, name: str, content: bytes) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as outfile:
+            outfile.write(content)
+        return path
+
+    def get(self, url: str, headers: dict = {}) -> http.client.HTTPResponse:
+        self.connection.request("GET", url, headers=headers)
+        response = self.connection.getresponse()
+        response.body = response.read()
+        return response
+
+
+class TestServer(ServerTestCase):
+    def test_keeps_connections_alive(self):
+        self.assertEqual(self.get("/").body, b"<h1>Home</h1>")
+        sock = self.connection.sock
+        self.assertEqual(self.get("/post/").body, b"<h1>Post</h1>")
+        self.assertIs(self.connection.sock, sock)
+
+    def test_redirects_directories(self):
+        response = self.get("/post")
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader("Location"), "/post/")
+
+    def test_conditional_requests(self):
+        response = self.get("/")
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+
+        self.assertEqual(self.get("/", {"If-None-Match": etag}).status, 304)
+        self.assertEqual(
+            self.get("/", {"If-Modified-Since": last_modified}).status, 304
+        )
+        self.assertEqual(self.get("/", {"If-None-Match": '"other"'}).status, 200)
+
+    def test_serves_precompressed_sidecars(self):
+        self.write("index.html.gz", gzip.compress(b"<h1>Home</h1>"))
+
+        response = self.get("/", {"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(response.body), b"<h1>Home</h1>")
+        self.assertEqual(response.getheader("Content-Type"), "text/html")
+
+        response = self.get("/")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(response.body, b"<h1>Home</h1>")
+
+    def test_ignores_stale_sidecars(self):
+        sidecar = self.write("index.html.gz", gzip.compress(b"<h1>Old</h1>"))
+        stat = os.stat(self.root / "index.html")
+        os.utime(sidecar, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+        response = self.get("/", {"Accept-Encoding": "gzip"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(response.body, b"<h1>Home</h1>")
+
+    def test_invalidates_rewritten_files(self):
+        path = self.root / "index.html"
+        self.get("/")
+        stat = os.stat(path)
+
+        # Same size and mtime, so only invalidation can tell the file changed
+        self.write("index.html", b"<h1>Away</h1>")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.get("/").body, b"<h1>Home</h1>")
+
+        server.file_cache.invalidate([path])
+        self.assertEqual(self.get("/").body, b"<h1>Away</h1>")
+
+
+class TestLiveReload(ServerTestCase):
+    live_reload = True
+
+    def test_injects_snippet(self):
+        self.write("index.html.gz", gzip.compress(b"<h1>Home</h1>"))
+        response = self.get("/", {"Accept-Encoding": "gzip"})
+
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertTrue(response.body.startswith(b"<h1>Home</h1><script>"))
+        self.assertIn(server.LIVE_RELOAD_PATH.encode(), response.body)
+
+    def test_pushes_changed_urls(self):
+        self.connection.request("GET", server.LIVE_RELOAD_PATH)
+        response = self.connection.getresponse()
+        self.assertEqual(response.getheader("Content-Type"), "text/event-stream")
+
+        graph = DependencyGraph()
+        graph.written = {Path("post/index.html"), Path("index.html")}
+        start = time.perf_counter()
+        server.live_reload.notify_build(graph)
+
+        self.assertEqual(
+            response.fp.readline(), b'data: {"urls": ["/", "/post/"], "all": false}\n'
+        )
+        self.assertLess(time.perf_counter() - start, 0.5)
@@ -1,12 +1,19 @@
+import contextlib
+import importlib
+import io
 import json
+import os
 from pathlib import Path
+import sys
 import tempfile
 import unittest
+from unittest.mock import patch
 
 import arrow
+from watchgod import Change
 
 from skip_ssg import skip
-from skip_ssg.sources import MarkdownFile
+from skip_ssg.sources import JSONFile, MarkdownFile, SitePage
 
 
 class TestWritePage(unittest.TestCase):
@@ -18,6 +25,35 @@ class TestWritePage(unittest.TestCase):
 
             self.assertTrue(full_path.exists())
 
+    def test_skips_unchanged_page(self):
+        with tempfile.TemporaryDirectory() as td:
+            td = Path(td)
+            full_path = td / Path("a/b/c")
+            self.assertTrue(
+                skip.write_page(td, Path("a/b/c"), Path("x/y/z"), "dummy", True)
+            )
+            os.utime(full_path, (0, 0))
+
+            self.assertFalse(
+                skip.write_page(td, Path("a/b/c"), Path("x/y/z"), "dummy", True)
+            )
+            self.assertEqual(os.path.getmtime(full_path), 0)
+
+            self.assertTrue(
+                skip.write_page(td, Path("a/b/c"), Path("x/y/z"), "dummy2", True)
+            )
+            with open(full_path) as infile:
+                self.assertEqual(infile.read(), "dummy2")
+
+    def test_reuses_created_dirs(self):
+        with tempfile.TemporaryDirectory() as td:
+            td = Path(td)
+            created_dirs = set()
+            skip.write_page(td, Path("a/x"), Path("x"), "x", True, created_dirs)
+            with patch("os.makedirs") as mock_makedirs:
+                skip.write_page(td, Path("a/y"), Path("y"), "y", True, created_dirs)
+            mock_makedirs.assert_not_called()
+
 
 class TestGetPageFiles(unittest.TestCase):
     def test_loads_right_data(self):
@@ -48,6 +84,28 @@ class TestGetPageFiles(unittest.TestCase):
                 self.assertTrue("b_json" in pf.data)
                 self.assertTrue("b_py" in pf.data)
 
+    def test_loads_each_data_file_once(self):
+        get_data = JSONFile.get_data
+        with patch.object(JSONFile, "get_data", autospec=True) as mock_get_data:
+            mock_get_data.side_effect = get_data
+            skip.get_page_files(
+                {}, lambda _: False, Path("tests/files/demo_site/"), {}, True
+            )
+
+        loaded = [call.args[0].path.name for call in mock_get_data.call_args_list]
+        self.assertEqual(
+            sorted(loaded), ["data_a1.json", "data_b1.json", "data_top.json"]
+        )
+
+    def test_shares_parent_data(self):
+        page_files = skip.get_page_files(
+            {}, lambda _: False, Path("tests/files/demo_site/"), {}, True
+        )
+        top = next(pf for pf in page_files if pf.path.name == "page_top.j2")
+        a1 = next(pf for pf in page_files if pf.path.name == "page_a1.j2")
+
+        self.assertIs(top.data.maps[1], a1.data.maps[2])
+
 
 class TestGetCollections(unittest.TestCase):
     def test_creates_all_collection(self):
@@ -84,3 +142,148 @@ class TestGetCollections(unittest.TestCase):
             collections = skip.get_collections([pfB, pfA])
 
             self.assertTrue(collections["all"][0].path == td / "a.md")
+
+    def test_sorts_tag_collections(self):
+        with tempfile.TemporaryDirectory() as td:
+            td = Path(td)
+            page_files = []
+            for name, date, tags in [
+                ("a", "2021-01-03", "x"),
+                ("b", "2021-01-01", "[x, y]"),
+                ("c", "2021-01-02", "[y, x]"),
+            ]:
+                with open(td / f"{name}.md", "w+") as outfile:
+                    outfile.write(f"---\ndate: {date}\ntags: {tags}\n---\n# {name}")
+                page_files.append(MarkdownFile(td / f"{name}.md", {}))
+
+            collections = skip.get_collections(page_files)
+
+            names = {
+                tag: [page.path.stem for page in pages]
+                for tag, pages in collections.items()
+            }
+            self.assertEqual(
+                names, {"all": ["b", "c", "a"], "x": ["b", "c", "a"], "y": ["b", "c"]}
+            )
+
+
+class TestBuildSite(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.config = {"output": "_site", "copy": [], "fail_on_error": True}
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write(self, name: str, content: str) -> None:
+        os.makedirs(Path(name).parent, exist_ok=True)
+        with open(name, "w") as outfile:
+            outfile.write(content)
+
+    def build(self, changes=None, graph=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return skip.build_site(self.config, skip.false, changes, graph)
+
+    def read(self, name: str) -> str:
+        with open(Path("_site", name)) as infile:
+            return infile.read()
+
+    def test_rebuilds_pages_using_changed_directory_data(self):
+        self.write("blog/author.json", '{"author": {"name": "Ada"}}')
+        self.write("blog/post.md", "---\ntags: blog\n---\n# Post")
+        self.write(
+            "index.html",
+            "{% for p in collections.blog %}{{ p.data.author.name }}{% endfor %}",
+        )
+        graph = self.build()
+        self.assertEqual(self.read("index.html"), "Ada")
+
+        self.write("blog/author.json", '{"author": {"name": "Grace"}}')
+        self.build({(Change.modified, "./blog/author.json")}, graph)
+        incremental = self.read("index.html")
+        self.build()
+        self.assertEqual(incremental, self.read("index.html"))
+        self.assertEqual(incremental, "Grace")
+
+    def test_rebuilds_pages_when_python_data_changes(self):
+        self.write("backend.txt", "Ada")
+        self.write(
+            "data/backend.py",
+            "def get_data():\n"
+            "    with open('backend.txt') as infile:\n"
+            "        return {'name': infile.read()}\n",
+        )
+        self.write("index.html", "{{ data.name }}")
+        self.write("about.html", "About")
+        graph = self.build()
+
+        self.write("about.html", "About us")
+        graph = self.build({(Change.modified, "./about.html")}, graph)
+        self.assertEqual(graph.written, {Path("about/index.html")})
+
+        self.write("backend.txt", "Grace")
+        graph = self.build({(Change.modified, "./about.html")}, graph)
+        self.assertEqual(graph.written, {Path("index.html")})
+        self.assertEqual(self.read("index.html"), "Grace")
+
+    def test_reuses_cached_pages_after_mtimes_change(self):
+        self.write("post.md", "---\ntags: blog\n---\n# Post")
+        self.write("index.html", "{% for p in collections.blog %}{{ p }}{% endfor %}")
+        self.write("dates.html", "{{ collections.blog[0].date.int_timestamp }}")
+        self.build()
+
+        # Like a fresh checkout
+        for name in ["post.md", "index.html", "dates.html"]:
+            os.utime(name, (1000, 1000))
+        with patch.object(
+            SitePage, "render", autospec=True, side_effect=SitePage.render
+        ) as render:
+            self.build()
+
+        rendered = {call.args[0].source.path for call in render.call_args_list}
+        self.assertEqual(rendered, {Path("dates.html")})
+        self.assertEqual(self.read("dates/index.html"), "1000")
+
+    def test_links_assets_without_fingerprinting(self):
+        self.write("static/s.css", "body {}")
+        self.write("index.html", "{{ asset('static/s.css') }}")
+        self.config["copy"] = ["static"]
+        self.build()
+        self.assertEqual(self.read("index.html"), "/static/s.css")
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        sys.path.insert(0, self.temp_dir.name)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        sys.path.remove(self.temp_dir.name)
+        sys.modules.pop("settings", None)
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+        # Load skip again without the settings file
+        with contextlib.redirect_stdout(io.StringIO()):
+            importlib.reload(skip)
+        return super().tearDown()
+
+    def test_uses_settings_options(self):
+        with open("settings.py", "w") as outfile:
+            outfile.write('OPTIONS = {"output": "public", "jobs": 1}\n')
+        with open("index.md", "w") as outfile:
+            outfile.write("# Home")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            importlib.reload(skip)
+            with patch.object(sys, "argv", ["skip"]):
+                skip.main()
+
+        self.assertTrue(Path("public/index.html").exists())
@@ -1,6 +1,9 @@
+import datetime
+import os
 from pathlib import Path
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import arrow
 import jinja2
@@ -18,6 +21,9 @@ from skip_ssg.sources import (
     PaginationSitePage,
     PythonFile,
     SitePage,
+    compile_permalink,
+    permalink_env,
+    to_timestamp,
 )
 
 
@@ -83,6 +89,25 @@ class TestPageFile(unittest.TestCase):
         md = MarkdownFile(path, {})
         self.assertEqual(md.date, arrow.get("2021-01-01"))
 
+    def test_converts_dates_to_timestamps_like_arrow(self):
+        for value in [
+            "2021-01-01",
+            "2021-01-01T10:30:00",
+            "2021-01-01T10:30:00+02:00",
+            "2021-01-01T10:30:00Z",
+            datetime.date(2021, 1, 1),
+            datetime.datetime(2021, 1, 1, 10, 30),
+            1609459200,
+            arrow.get("2021-01-01"),
+        ]:
+            self.assertEqual(to_timestamp(value), arrow.get(value).timestamp())
+
+    def test_keeps_date_timezone(self):
+        page_file = Jinja2File(Path("tests/files/tags.html"), {})
+        page_file.date = "2021-01-01T10:30:00+02:00"
+        self.assertEqual(page_file.date, arrow.get("2021-01-01T10:30:00+02:00"))
+        self.assertEqual(page_file.date.tzinfo.utcoffset(None).seconds, 7200)
+
     def test_gets_permalink(self):
         path = Path("tests/files/tags.html")
         page_file = Jinja2File(path, {})
@@ -105,22 +130,44 @@ class TestPageFile(unittest.TestCase):
             page_file.get_permalink()
 
 
+class TestLazyPageFile(unittest.TestCase):
+    def test_does_not_keep_content(self):
+        path = Path("tests/files/pagination2.j2")
+        eager = Jinja2File(path, {})
+        lazy = Jinja2File(path, {}, lazy=True)
+
+        self.assertIsNone(lazy._content)
+        self.assertEqual(lazy.content, eager.content)
+        self.assertEqual(lazy.data["things"], eager.data["things"])
+
+    def test_loaded_keeps_content_while_rendering(self):
+        jinja2_env = jinja2.Environment()
+        lazy = Jinja2File(Path("tests/files/pagination2.j2"), {}, lazy=True)
+        with lazy.loaded():
+            self.assertIsNotNone(lazy._content)
+            html = list(lazy.get_pages({}))[0].render(jinja2_env)
+
+        self.assertTrue("<p>a</p>" in html)
+        self.assertIsNone(lazy._content)
+        self.assertIsNone(lazy.template)
+
+
 class TestGetPages(unittest.TestCase):
     def test_returns_single_page(self):
         html_file = Jinja2File(Path("tests/files/tags.html"), {})
-        pages = html_file.get_pages({})
+        pages = list(html_file.get_pages({}))
         self.assertEqual(len(pages), 1)
         self.assertEqual(pages[0].source.content, "<h1>Hello</h1>")
 
     def test_size_1_pagination(self):
         j2_file = Jinja2File(Path("tests/files/pagination.j2"), {})
-        pages = j2_file.get_pages({"a": ["dummy1", "dummy2"]})
+        pages = list(j2_file.get_pages({"a": ["dummy1", "dummy2"]}))
         self.assertEqual(len(pages), 2)
         self.assertEqual(pages[0].items, ["dummy1"])
 
     def test_size_2_pagination(self):
         j2_file = Jinja2File(Path("tests/files/pagination2.j2"), {})
-        pages = j2_file.get_pages({})
+        pages = list(j2_file.get_pages({}))
         self.assertEqual(len(pages), 3)
         self.assertEqual(pages[1].items, ["c", "d"])
 
@@ -128,7 +175,7 @@ class TestGetPages(unittest.TestCase):
         j2_file = Jinja2File(Path("tests/files/pagination.j2"), {})
 
         with self.assertRaises(MissingPaginationSourceException):
-            j2_file.get_pages({"b": ["dummy1", "dummy2"]})
+            list(j2_file.get_pages({"b": ["dummy1", "dummy2"]}))
 
 
 class TestRender(unittest.TestCase):
@@ -141,23 +188,44 @@ class TestRender(unittest.TestCase):
 
     def test_renders_html(self):
         j2_file = Jinja2File(Path("tests/files/tags.html"), {})
-        pages = j2_file.get_pages({})
+        pages = list(j2_file.get_pages({}))
         html = pages[0].render(self.jinja2_env)
         self.assertEqual("<h1>Hello</h1>", html)
 
     def test_renders_with_layout(self):
         md_file = MarkdownFile(Path("tests/files/layout.md"), {})
-        pages = md_file.get_pages({})
+        pages = list(md_file.get_pages({}))
         html = pages[0].render(self.jinja2_env)
         self.assertTrue("<main>" in html)
 
     def test_renders_with_pagination_items(self):
         j2_file = Jinja2File(Path("tests/files/pagination2.j2"), {})
-        pages = j2_file.get_pages({})
+        pages = list(j2_file.get_pages({}))
         html = pages[0].render(self.jinja2_env)
         self.assertTrue("<p>a</p>" in html)
         self.assertTrue("<p>b</p>" in html)
 
+    def test_compiles_pagination_template_once(self):
+        j2_file = Jinja2File(Path("tests/files/pagination2.j2"), {})
+        pages = list(j2_file.get_pages({}))
+        pages[0].render(self.jinja2_env)
+        template = j2_file.template
+        html = pages[1].render(self.jinja2_env)
+
+        self.assertIs(j2_file.template, template)
+        self.assertTrue("<p>c</p>" in html)
+
+    def test_uses_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as td:
+            jinja2_env = jinja2.Environment(
+                bytecode_cache=jinja2.FileSystemBytecodeCache(td)
+            )
+            j2_file = Jinja2File(Path("tests/files/pagination2.j2"), {})
+            html = list(j2_file.get_pages({}))[0].render(jinja2_env)
+
+            self.assertTrue("<p>a</p>" in html)
+            self.assertEqual(len(os.listdir(td)), 1)
+
 
 class TestGetpath(unittest.TestCase):
     @classmethod
@@ -212,6 +280,40 @@ class TestGetpath(unittest.TestCase):
 
         self.assertEqual(site_page.get_path(), Path("x/y/z/index.html"))
 
+    def test_leading_slash_stays_in_site(self):
+        mock_pagefile = Mock()
+        mock_pagefile.path = Path("a/b/c/pagefile.html")
+        site_page = SitePage(mock_pagefile, {"permalink": "/"}, {})
+
+        self.assertEqual(site_page.get_path(), Path("index.html"))
+        self.assertEqual(site_page.get_permalink(), "/")
+
+    def test_compiles_permalink_once(self):
+        mock_pagefile = Mock()
+        mock_pagefile.path = Path("a/b/c/pagefile.html")
+        data = {"permalink": "x/{{data.middle}}/z/", "middle": "dummy"}
+        site_page = SitePage(mock_pagefile, data, {})
+        pagination_page = PaginationSitePage(mock_pagefile, data, {}, 1, [])
+
+        with patch.object(
+            permalink_env, "from_string", wraps=permalink_env.from_string
+        ) as mock_from_string:
+            compile_permalink.cache_clear()
+            site_page.get_path()
+            site_page.get_path()
+            pagination_page.get_path()
+
+        mock_from_string.assert_called_once()
+
+    def test_memoises_page_file_permalink(self):
+        page_file = Jinja2File(Path("tests/files/tags.html"), {})
+        with patch.object(SitePage, "resolve_path", autospec=True) as mock_resolve:
+            mock_resolve.return_value = Path("x/index.html")
+            self.assertEqual(page_file.get_permalink(), "/x/")
+            self.assertEqual(page_file.get_permalink(), "/x/")
+
+        mock_resolve.assert_called_once()
+
     def test_renders_path_as_template(self):
         mock_pagefile = Mock()
         mock_pagefile.path = Path("a/b/c/pagefile.html")
@@ -230,3 +332,37 @@ class TestGetData(unittest.TestCase):
     def test_python_file(self):
         python_file = PythonFile(Path("tests/files/my-data.py"))
         self.assertEqual(python_file.get_data(), ["a", "b", "c"])
+
+
+class TestMarkdownConverter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "code.md"
+        with open(self.path, "w+") as outfile:
+            outfile.write("# Title\n\n```python\nx = 1\n```\n")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        MarkdownFile.configure(["codehilite", "fenced_code"], {})
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_reuses_converter(self):
+        md_file = MarkdownFile(self.path, {})
+        first = md_file.get_html(None)
+        converter = MarkdownFile.converter
+        second = md_file.get_html(None)
+
+        self.assertIs(MarkdownFile.converter, converter)
+        self.assertEqual(first, second)
+        self.assertTrue('class="codehilite"' in first)
+
+    def test_configures_extensions(self):
+        md_file = MarkdownFile(self.path, {})
+        md_file.get_html(None)
+
+        MarkdownFile.configure(["fenced_code"], {})
+        self.assertIsNone(MarkdownFile.converter)
+        html = md_file.get_html(None)
+        self.assertFalse("codehilite" in html)
+        self.assertTrue("<code" in html)
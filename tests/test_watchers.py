@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from watchgod import Change
+
+from skip_ssg import watchers
+
+
+class WatcherTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.write("index.md", "# Home")
+        self.write("build/site/index.html", "<h1>Home</h1>")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        return super().tearDown()
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as outfile:
+            outfile.write(content)
+        return path
+
+
+class TestPollingWatcher(WatcherTestCase):
+    def test_ignores_output(self):
+        watcher = watchers.SkipDefaultWatcher(self.root, {"build/site"})
+        self.write("build/site/post/index.html", "<h1>Post</h1>")
+        self.assertEqual(watcher.check(), set())
+
+        path = self.write("post.md", "# Post")
+        self.assertEqual(watcher.check(), {(Change.added, path)})
+
+
+@unittest.skipIf(watchers._libc is None, "inotify is not available")
+class TestInotifyWatcher(WatcherTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.watcher = watchers.InotifyWatcher(
+            self.root, watchers.WatchFilter(self.root, {"build/site"})
+        )
+        self.changes = self.watcher.watch(debounce=0.05)
+
+    def tearDown(self) -> None:
+        self.watcher.close()
+        return super().tearDown()
+
+    def test_batches_bursts(self):
+        self.write("build/site/post/index.html", "<h1>Post</h1>")
+        index = self.write("index.md", "# Home again")
+        temp = self.write("temp.md", "")
+        os.remove(temp)
+        post = self.write("posts/a.md", "# A")
+        self.write("posts/.a.md.swp", "")
+
+        self.assertEqual(
+            next(self.changes), {(Change.modified, index), (Change.added, post)}
+        )
+
+    def test_rebuilds_after_directory_removal(self):
+        self.write("posts/a.md", "# A")
+        next(self.changes)
+
+        os.remove(os.path.join(self.root, "posts/a.md"))
+        os.rmdir(os.path.join(self.root, "posts"))
+        self.assertIsNone(next(self.changes))
+        self.assertEqual(
+            sorted(self.watcher.directories.values()),
+            sorted([self.root, str(Path(self.root, "build"))]),
+        )